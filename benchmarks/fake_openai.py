@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import random
+import re
+from collections import Counter
+
+from fastapi import FastAPI, Request
+
+# Stand-in for the OpenAI chat completions API. Replies are canned JSON shaped
+# like what server.py and globalworth.inpainting.openai expect, picked by
+# recognising each prompt; latency is base + uniform jitter + per output token
+LATENCY_MS = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "300"))
+JITTER_MS = float(os.getenv("FAKE_OPENAI_JITTER_MS", "100"))
+MS_PER_TOKEN = float(os.getenv("FAKE_OPENAI_MS_PER_TOKEN", "2"))
+# How many missing form fields each conversational reply fills in
+FIELDS_PER_TURN = int(os.getenv("FAKE_OPENAI_FIELDS_PER_TURN", "3"))
+
+INQUIRY_VALUES = {
+    "preferred_district_or_area": "Centrum",
+    "preferred_floor": "dowolne",
+    "office_area_m2": 120,
+    "number_of_employees": 20,
+    "office_type": "Open space",
+    "rental_period_start": "2025-09-01",
+    "rental_period_end": "2027-08-31",
+    "access_hours": "24/7",
+    "monthly_budget_net_PLN": 9000,
+    "short_term_rental": False,
+}
+
+DESIGN_VALUES = {
+    "interior_style": "Skandynawski",
+    "layout_preferences": ["Open space", "Sale konferencyjne", "Kącik relaksacyjny"],
+    "equipment_and_features": ["Krzesła ergonomiczne", "Stoliki kawowe", "Rośliny"],
+    "additional_notes_on_design": "Dużo naturalnego światła i jasne drewno.",
+}
+
+QUESTION = "Jaką powierzchnię biura Państwo potrzebują i ile osób będzie w nim pracować?"
+
+MISSING_FIELD = re.compile(r"^- (\w+) \(", re.MULTILINE)
+
+app = FastAPI()
+calls = Counter()
+tokens = Counter()
+
+
+def _text(message) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content
+
+
+def _fill(messages, values):
+    # Answers the first missing fields listed in the compact form (developer message)
+    form = next((_text(m) for m in messages if m["role"] == "developer"), "")
+    missing = [name for name in MISSING_FIELD.findall(form) if name in values]
+    return {name: values[name] for name in missing[:FIELDS_PER_TURN]}, len(missing) > FIELDS_PER_TURN
+
+
+def _candidates(prompt: str):
+    start = prompt.index("[", prompt.index("## Dostępne"))
+    return json.JSONDecoder().raw_decode(prompt[start:])[0]
+
+
+def _reply(body):
+    messages = body["messages"]
+    system = _text(messages[0])
+    prompt = _text(messages[-1])
+    values = DESIGN_VALUES if "projektanta wnętrz" in system else INQUIRY_VALUES
+    form = "design" if values is DESIGN_VALUES else "inquiry"
+
+    if '"next_question"' in system:
+        fields, more = _fill(messages, values)
+        return f"{form}_turn", {"fields": fields, "next_question": QUESTION if more else None}
+    if "'description'" in system:
+        return "inpainting_prompts", {
+            "description": [
+                "Skandynawskie open space z jasnymi biurkami i roślinami",
+                "Sala konferencyjna z dużym stołem i drewnianymi akcentami",
+                "Kącik relaksacyjny z sofą, stolikiem kawowym i lampami",
+            ]
+        }
+    if '"best_match"' in prompt:
+        candidates = _candidates(prompt)
+        first = candidates[0]
+        best = first["budynek"]["nazwa"] if "budynek" in first else first["numer_pietra"]
+        return "inquiry_match", {
+            "best_match": best,
+            "match_score": 87,
+            "reasoning": "Spełnia wymagania dotyczące powierzchni i lokalizacji.",
+            "recommendation": f"Polecamy {best}. ",
+        }
+    if isinstance(messages[-1]["content"], list):
+        images = sum(1 for part in messages[-1]["content"] if part.get("type") == "image_url")
+        return "initial_design", {
+            "designs": [
+                {
+                    "space_name": f"Przestrzeń {i + 1}",
+                    "design_description": "Jasne drewno, biel i zieleń, miękkie tekstylia.",
+                    "layout_description": "Biurka przy oknach, sofa i regały przy ścianie.",
+                    "key_elements": ["biurka", "krzesła ergonomiczne", "rośliny"],
+                }
+                for i in range(images)
+            ]
+        }
+    if body.get("response_format"):
+        fields, _ = _fill(messages, values)
+        return f"{form}_extract", fields
+    return f"{form}_question", QUESTION
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    kind, reply = _reply(body)
+    content = reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+    # Roughly 4 characters per token, image parts included
+    prompt_tokens = len(json.dumps(body["messages"])) // 4
+    completion_tokens = max(1, len(content) // 4)
+    calls[kind] += 1
+    tokens[kind] += prompt_tokens + completion_tokens
+
+    await asyncio.sleep((LATENCY_MS + random.uniform(0, JITTER_MS) + MS_PER_TOKEN * completion_tokens) / 1000)
+    return {
+        "id": f"chatcmpl-fake-{sum(calls.values())}",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {"calls": dict(calls), "tokens": dict(tokens)}
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.scenarios import SCENARIOS, office_images
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Compared between runs; the sign says which direction is a regression
+COMPARED = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "requests_per_s": -1, "cpu_ms_per_request": 1}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_openai(args):
+    # A separate process, so its CPU time is not charged to the endpoints
+    port = free_port()
+    env = {
+        **os.environ,
+        "FAKE_OPENAI_LATENCY_MS": str(args.latency_ms),
+        "FAKE_OPENAI_JITTER_MS": str(args.jitter_ms),
+        "FAKE_OPENAI_MS_PER_TOKEN": str(args.ms_per_token),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.fake_openai:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{url}/stats")
+            return process, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Fake OpenAI server did not start.")
+
+
+def configure(args, openai_url, workdir):
+    # Must run before server and inpaint are imported: both read env at import
+    os.environ.update({
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "ASSETS_DIR": os.path.join(workdir, "assets"),
+        "SESSION_STORE": "memory",
+        "INPAINT_WORKERS": "0",
+        "INPAINT_PIPELINE_FACTORY": "benchmarks.stub_pipeline:StubPipeline",
+        "BENCH_STUB_STEP_MS": str(args.step_ms),
+    })
+    if not args.cache:
+        os.environ.update({"LLM_CACHE": "0", "INPAINT_CACHE": "0"})
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.cpu = defaultdict(float)
+        self.rss = defaultdict(float)
+        self.rss_growth = defaultdict(float)
+        self.llm_calls = defaultdict(int)
+        self.llm_tokens = defaultdict(int)
+
+    def summary(self):
+        endpoints = {}
+        for endpoint, latencies in self.latencies.items():
+            count = len(latencies)
+            endpoints[endpoint] = {
+                "requests": count,
+                "errors": self.errors[endpoint],
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "requests_per_s": round(count / self.seconds[endpoint], 2),
+                "cpu_ms_per_request": round(self.cpu[endpoint] * 1000 / count, 2),
+                "rss_mb": round(self.rss[endpoint], 1),
+                "rss_growth_mb": round(self.rss_growth[endpoint], 1),
+                "llm_calls_per_request": round(self.llm_calls[endpoint] / count, 2),
+                "llm_tokens_per_request": round(self.llm_tokens[endpoint] / count),
+            }
+        return endpoints
+
+
+async def _fake_stats(client):
+    stats = (await client.get("/stats")).json()
+    return sum(stats["calls"].values()), sum(stats["tokens"].values())
+
+
+async def _send(clients, request):
+    started = time.perf_counter()
+    response = await clients[request.app].request(request.method, request.path, json=request.json)
+    return response, time.perf_counter() - started
+
+
+async def run_scenario(scenario, clients, fake, fixtures, concurrency, stats):
+    """Runs `concurrency` copies of a scenario, one step at a time.
+
+    All copies send the same step together, so the CPU time, memory growth
+    and LLM calls measured around a step belong to that step's endpoint.
+    """
+    conversations = [scenario(fixtures) for _ in range(concurrency)]
+    pending = [(conversation, next(conversation)) for conversation in conversations]
+    while pending:
+        calls, tokens = await _fake_stats(fake)
+        rss = rss_mb()
+        cpu = time.process_time()
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(_send(clients, request) for _, request in pending))
+        seconds = time.perf_counter() - started
+        cpu = time.process_time() - cpu
+        calls_after, tokens_after = await _fake_stats(fake)
+        rss_after = rss_mb()
+
+        share = 1 / len(pending)
+        following = []
+        for (conversation, request), (response, latency) in zip(pending, responses):
+            endpoint = request.endpoint
+            stats.latencies[endpoint].append(latency)
+            stats.seconds[endpoint] += seconds * share
+            stats.cpu[endpoint] += cpu * share
+            stats.rss[endpoint] = max(stats.rss[endpoint], rss_after)
+            stats.rss_growth[endpoint] += (rss_after - rss) * share
+            stats.llm_calls[endpoint] += (calls_after - calls) * share
+            stats.llm_tokens[endpoint] += (tokens_after - tokens) * share
+            if response.status_code >= 400:
+                stats.errors[endpoint] += 1
+                print(f"{endpoint}: {response.status_code} {response.text[:200]}", file=sys.stderr)
+                continue
+            try:
+                following.append((conversation, conversation.send(response)))
+            except StopIteration:
+                pass
+        pending = following
+
+
+async def wait_ready(client, timeout=300):
+    deadline = time.monotonic() + timeout
+    while (await client.get("/ready")).status_code != 200:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Inpainting pipeline did not become ready.")
+        await asyncio.sleep(0.1)
+
+
+async def benchmark(args, fake_url):
+    apps = {name: importlib.import_module(name).app for name in ("server", "inpaint")}
+    fixtures = {"images": office_images(), "tier": args.tier}
+    stats = Stats()
+    async with AsyncExitStack() as stack:
+        clients = {}
+        for name, app in apps.items():
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            clients[name] = await stack.enter_async_context(
+                httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=f"http://{name}", timeout=600)
+            )
+        fake = await stack.enter_async_context(httpx.AsyncClient(base_url=fake_url))
+        await wait_ready(clients["inpaint"])
+
+        for name in args.scenarios:
+            if args.warmup:
+                await run_scenario(SCENARIOS[name], clients, fake, fixtures, 1, Stats())
+            for _ in range(args.iterations):
+                await run_scenario(SCENARIOS[name], clients, fake, fixtures, args.concurrency, stats)
+    return stats.summary()
+
+
+def compare(results, baseline, threshold):
+    """Prints changes against `baseline`; returns the regressed metrics."""
+    regressions = []
+    print(f"\nAgainst baseline {baseline.get('name')} ({baseline.get('commit')}):")
+    for endpoint, current in results["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before is None:
+            print(f"  {endpoint}: new")
+            continue
+        changes = []
+        for metric, direction in COMPARED.items():
+            if not before[metric]:
+                continue
+            change = (current[metric] - before[metric]) / before[metric]
+            flag = ""
+            if change * direction > threshold:
+                flag = " !"
+                regressions.append(f"{endpoint} {metric}")
+            changes.append(f"{metric} {change:+.0%}{flag}")
+        print(f"  {endpoint}: {', '.join(changes)}")
+    return regressions
+
+
+def report(endpoints):
+    columns = ["requests", "errors", "p50_ms", "p95_ms", "p99_ms", "requests_per_s", "cpu_ms_per_request",
+               "rss_mb", "rss_growth_mb", "llm_calls_per_request", "llm_tokens_per_request"]
+    width = max(len(endpoint) for endpoint in endpoints)
+    print(f"{'endpoint':<{width}}  " + "  ".join(columns))
+    for endpoint, row in endpoints.items():
+        print(f"{endpoint:<{width}}  " + "  ".join(f"{row[column]:>{len(column)}}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of server.py and inpaint.py.")
+    parser.add_argument("scenarios", nargs="*", help=f"Any of {', '.join(SCENARIOS)}; all by default")
+    parser.add_argument("--concurrency", type=int, default=8, help="Conversations run side by side")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake OpenAI base latency")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--ms-per-token", type=float, default=2)
+    parser.add_argument("--step-ms", type=float, default=20, help="Stub pipeline time per diffusion step")
+    parser.add_argument("--tier", default="standard", choices=["preview", "standard", "high"])
+    parser.add_argument("--cache", action="store_true", help="Keep the LLM and inpainting result caches on")
+    parser.add_argument("--save", metavar="NAME", help="Store the results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fake, fake_url = start_fake_openai(args)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure(args, fake_url, workdir)
+            endpoints = asyncio.run(benchmark(args, fake_url))
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    results = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("save", "compare", "threshold")},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "endpoints": endpoints,
+    }
+    report(endpoints)
+    print(f"\npeak RSS {results['peak_rss_mb']} MB")
+
+    if args.save:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        with open(os.path.join(BASELINES_DIR, f"{args.save}.json"), "w") as f:
+            json.dump({"name": args.save, **results}, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f"{args.compare}.json")) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
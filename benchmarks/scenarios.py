@@ -0,0 +1,109 @@
+import base64
+import os
+from typing import Any, NamedTuple, Optional
+
+# Scripted conversations replaying the examples/ notebooks. Each scenario is
+# a generator yielding Requests and receiving their httpx responses, so the
+# runner can drive many copies of it in lockstep
+
+
+class Request(NamedTuple):
+    app: str
+    method: str
+    path: str
+    json: Any = None
+    # Path template used to group latencies, e.g. "/sessions/{id}"
+    route: Optional[str] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.app} {self.method} {self.route or self.path}"
+
+
+# From examples/inquiry_stage_1.ipynb, continued until the form is complete
+INQUIRY_MESSAGES = [
+    "Potrzebuję biura na 120m i żeby pomieściło 20 osób. Najlepiej w centrum miasta.",
+    "Piętro nie ma znaczenia, szukamy open space.",
+    "Od września 2025 na dwa lata, z dostępem 24/7.",
+    "Budżet to około 9000 zł netto miesięcznie, nie interesuje nas krótki najem.",
+]
+
+# From examples/inquiry_stage_2.ipynb
+DESIGN_MESSAGES = [
+    "Chciałbym urządzić biuro w stylu skandynawskim",
+    "Open space, sala konferencyjna i kącik relaksacyjny.",
+    "Krzesła ergonomiczne, stoliki kawowe i dużo roślin.",
+]
+
+# From examples/design_conv.ipynb
+DESIGN_SECTIONS = {
+    "interior_style": {
+        "description": "Preferowany styl aranżacji (np. Nowoczesny, Klasyczny, Industrialny, Skandynawski, Minimalistyczny, Inny)",
+        "value": "Skandynawski z elementami naturalnymi",
+    },
+    "layout_preferences": {
+        "description": "Lista preferowanych układów biura, np. Open space, Sale konferencyjne, Biura prywatne, Kącik relaksacyjny",
+        "value": ["Open space", "Chill-out room"],
+    },
+    "equipment_and_features": {
+        "description": "Lista wymaganych elementów wyposażenia (np. Meble biurowe, Krzesła ergonomiczne, Stoliki kawowe, Stół bilardowy i inne)",
+        "value": ["Krzesła ergonomiczne", "Biurka", "Stół do ping-ponga", "Wygodne pufy i sofy", "Rośliny doniczkowe"],
+    },
+    "additional_notes_on_design": {
+        "description": "Dodatkowe wymagania i preferencje dotyczące aranżacji biura",
+        "value": "W przestrzeniach wspólnych zalecane są ciepłe kolory i materiały.",
+    },
+}
+
+OFFICE_IMAGES_DIR = "office_images"
+
+
+def office_images(count: int = 3):
+    paths = sorted(os.listdir(OFFICE_IMAGES_DIR))[:count]
+    images = []
+    for path in paths:
+        with open(os.path.join(OFFICE_IMAGES_DIR, path), "rb") as image_file:
+            images.append(f"data:image/jpeg;base64,{base64.b64encode(image_file.read()).decode('utf-8')}")
+    return images
+
+
+def _session_turns(app, path, messages, session_id):
+    for message in messages:
+        response = yield Request(app, "POST", path, {"message": message, "session_id": session_id})
+        if response.json()["conversation_completed"]:
+            return
+    raise RuntimeError(f"Conversation at {path} did not complete in {len(messages)} messages.")
+
+
+def inquiry(fixtures):
+    response = yield Request("server", "POST", "/start-inquiry/")
+    session_id = response.json()["session_id"]
+    yield from _session_turns("server", "/parse-inquiry-message/", INQUIRY_MESSAGES, session_id)
+    response = yield Request("server", "GET", f"/sessions/{session_id}", route="/sessions/{id}")
+    yield Request("server", "POST", "/find-best-inquiry-match/", response.json()["inquiry_state"])
+
+
+def design(fixtures):
+    response = yield Request("server", "POST", "/start-design/")
+    session_id = response.json()["session_id"]
+    yield from _session_turns("server", "/parse-design-message/", DESIGN_MESSAGES, session_id)
+    yield Request("server", "GET", f"/sessions/{session_id}", route="/sessions/{id}")
+    yield Request("server", "POST", "/get-initial-design/", {**DESIGN_SECTIONS, "office_images": fixtures["images"]})
+
+
+def inpaint(fixtures):
+    request = {
+        **DESIGN_SECTIONS,
+        "images": {"description": "Zdjęcia pustych biur", "value": fixtures["images"]},
+        "tier": fixtures["tier"],
+    }
+    response = yield Request("inpaint", "POST", "/get-initial-design", request)
+    first = response.json()["results"][0]
+    yield Request("inpaint", "POST", "/modify-design", {
+        "image": first["image"],
+        "prompt": "Dodaj więcej roślin przy oknach",
+        "tier": fixtures["tier"],
+    })
+
+
+SCENARIOS = {"inquiry": inquiry, "design": design, "inpaint": inpaint}
@@ -0,0 +1,35 @@
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+# Milliseconds a denoising step takes, for the whole batch
+STEP_MS = float(os.getenv("BENCH_STUB_STEP_MS", "20"))
+
+
+class StubPipeline:
+    """Takes the place of the diffusers inpainting pipeline in benchmarks.
+
+    Accepts the arguments generate_inpainted_images passes, sleeps for the
+    steps it was asked for and paints the masked area a seed-dependent
+    colour. Step callbacks are not called: previews need real latents.
+    Inject with INPAINT_PIPELINE_FACTORY=benchmarks.stub_pipeline:StubPipeline.
+    """
+
+    def __init__(self, step_ms: float = STEP_MS):
+        self.step_ms = step_ms
+
+    def make_generator(self, seed: int):
+        return np.random.default_rng(seed)
+
+    def __call__(self, prompt, image, mask_image, generator, num_inference_steps, **options):
+        time.sleep(self.step_ms * num_inference_steps / 1000)
+        images = []
+        for source, mask, rng in zip(image, mask_image, generator):
+            base = np.asarray(source.convert("RGB"), dtype=np.float32)
+            alpha = np.asarray(mask.convert("L").resize(source.size), dtype=np.float32)[..., None] / 255
+            colour = rng.integers(0, 256, size=3).astype(np.float32)
+            images.append(Image.fromarray((base * (1 - alpha) + colour * alpha).astype(np.uint8)))
+        return SimpleNamespace(images=images)
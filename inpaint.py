@@ -1,66 +1,407 @@
+import asyncio
+import base64
 import json
-from openai import OpenAI
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import multiprocessing
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 
 
-from globalworth.inpainting.pipeline import get_pipeline, generate_inpainted_image
-from globalworth.inpainting.api import read_image, encode_image
+from globalworth.inpainting.batching import MicroBatcher, INTERACTIVE, BULK
+from globalworth.inpainting.jobs import JobManager
+from globalworth.inpainting.cache import ResultCache, result_key
+from globalworth.inpainting.config import DEFAULT_SEED, DEFAULT_TIER, quality_tiers_from_env
+from globalworth.inpainting.pipeline import PipelineManager, READY, LOADING, FAILED
+from globalworth.inpainting.previews import PreviewHub
+from globalworth.inpainting.api import (
+    read_image, open_native, decode_base64, image_to_bytes, wants_binary, binary_response
+)
+from globalworth.inpainting.image_utils import mask_spec_key
 from globalworth.inpainting.openai import get_inpainting_prompts
 from globalworth.inpainting.models import OfficeDesignRequest, InpaintModification
+from globalworth.llm.client import LLMClient
+from globalworth.llm.resilience import LLMUnavailable
+from globalworth.assets.store import AssetStore
+from globalworth.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, stage
 
 load_dotenv()
 
-app = FastAPI()
-pipeline = get_pipeline()
-client = OpenAI()
+llm = LLMClient.from_env()
 
+# Diffusion runs in dedicated worker processes, each holding one pipeline;
+# INPAINT_WORKERS=0 keeps it in this process on a background thread. Either
+# way the weights load after startup, reported by /ready
+INPAINT_WORKERS = int(os.getenv("INPAINT_WORKERS", "1"))
+# INPAINT_POOL=fork (cpu profile, Linux only) loads the weights once in this
+# process and forks the workers afterwards, so they share a single copy.
+# Forking a threaded server is inherently fragile (see create_forked_pool),
+# so spawn is the default
+INPAINT_POOL = os.getenv("INPAINT_POOL", "spawn")
+# Intra-op threads per worker; by default the cores are split between workers
+INPAINT_WORKER_THREADS = int(os.getenv("INPAINT_WORKER_THREADS", "0")) or max(
+    1, (os.cpu_count() or 1) // max(INPAINT_WORKERS, 1)
+)
+pipeline = PipelineManager.from_env()
+warming = None
+pool_ready = None
+# Step previews for streaming requests travel back from wherever inference runs
+previews = PreviewHub(multiprocessing.get_context("spawn").Queue() if INPAINT_WORKERS > 0 else None)
+PREVIEW_EVERY = int(os.getenv("INPAINT_PREVIEW_EVERY", "5"))
+if INPAINT_WORKERS > 0:
+    from globalworth.inpainting.workers import (
+        create_forked_pool, create_worker_pool, load_for_fork, run_batch, warm_up
+    )
 
-@app.post("/get-initial-design")
-async def process_images(
-    data: OfficeDesignRequest
-):  
-    prompts = get_inpainting_prompts(client, data)
-    images = data.images.value
-
-    if len(images) != len(prompts):
-        return JSONResponse(
-            status_code=400,
-            content={"error": "Number of images and prompts must be equal."},
-        )
+    if INPAINT_POOL == "fork":
+        executor = create_forked_pool(pipeline, INPAINT_WORKERS, INPAINT_WORKER_THREADS, previews.queue)
+        pool_ready = asyncio.Event()
+    else:
+        executor = create_worker_pool(INPAINT_WORKERS, INPAINT_WORKER_THREADS, previews.queue)
+else:
+    executor = None
+    pipeline.preview_queue = previews.queue
+    run_batch = pipeline.run_batch
+
+# Concurrent requests share pipeline calls; the queue is bounded
+batcher = MicroBatcher(
+    run_batch,
+    max_batch_size=int(os.getenv("INPAINT_MAX_BATCH_SIZE", "4")),
+    max_wait=float(os.getenv("INPAINT_BATCH_WAIT_MS", "20")) / 1000,
+    executor=executor,
+    concurrency=max(INPAINT_WORKERS, 1),
+    max_queue=int(os.getenv("INPAINT_MAX_QUEUE", "32")),
+    ready=pool_ready,
+)
+jobs = JobManager(ttl=float(os.getenv("INPAINT_JOB_TTL_SECONDS", "3600")))
+results_cache = ResultCache.from_env()
+assets = AssetStore.from_env()
+
+# Default encoding of generated images; requests may override both
+OUTPUT_FORMAT = os.getenv("INPAINT_OUTPUT_FORMAT", "png").lower()
+OUTPUT_QUALITY = int(os.getenv("INPAINT_OUTPUT_QUALITY", "90"))
+
+# Native resolution requests are scaled down past this many pixels
+MAX_PIXELS = int(os.getenv("INPAINT_MAX_PIXELS", str(16 * 2**20)))
+
+# Diffusion steps per quality tier; requests pick a tier or an explicit count
+QUALITY_TIERS = quality_tiers_from_env()
 
-    results = []
+QUEUE_FULL = JSONResponse(status_code=429, content={"error": "Inpainting queue is full, try again later."})
 
-    for image, prompt in zip(images, prompts):
-        pil_image = await read_image(image)
-        image = generate_inpainted_image(pipeline, pil_image, prompt)
-        image = encode_image(image)
 
-        results.append(
-            {
-                "image": image,
-                "prompt": prompt,
-            }
+async def _start_workers():
+    if pool_ready is not None:
+        # Nothing may fork a worker before the weights are in memory
+        try:
+            await asyncio.to_thread(load_for_fork, pipeline)
+        finally:
+            pool_ready.set()
+    return await warm_up(executor, INPAINT_WORKERS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global warming
+    previews.start()
+    if executor is not None:
+        warming = asyncio.create_task(_start_workers())
+    else:
+        pipeline.start()
+    batcher.start()
+    yield
+    if warming is not None:
+        warming.cancel()
+    await jobs.stop()
+    await batcher.stop()
+    previews.stop()
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+    await llm.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# Read when /metrics is scraped
+REGISTRY.gauge("inpaint_queue_depth", "Images waiting for a pipeline call.", lambda: batcher.queue_depth)
+REGISTRY.gauge("inpaint_jobs_running", "Background jobs still running.", lambda: jobs.running)
+REGISTRY.gauge("inpaint_preview_streams", "Open preview streams.", lambda: previews.streams)
+
+
+def _results(encoded, prompts, format):
+    return [
+        {
+            "image": base64.b64encode(data).decode("utf-8"),
+            "prompt": prompt,
+            "format": format,
+        }
+        for data, prompt in zip(encoded, prompts)
+    ]
+
+
+async def _input_images(images, image_ids, native=False):
+    # Stored assets already have a 512x512 derivative, so nothing is decoded twice;
+    # native resolution starts from the stored original
+    if image_ids:
+        if native:
+            originals = [assets.read(asset_id) for asset_id in image_ids]
+            loaded = [open_native(data, MAX_PIXELS) if data is not None else None for data in originals]
+        else:
+            loaded = [assets.load_image(asset_id) for asset_id in image_ids]
+        unknown = [asset_id for asset_id, image in zip(image_ids, loaded) if image is None]
+        if unknown:
+            raise ValueError(f"Unknown assets: {', '.join(unknown)}")
+        return loaded
+    if not images:
+        raise ValueError("Either images or image ids are required.")
+    if native:
+        return [open_native(decode_base64(image), MAX_PIXELS) for image in images]
+    return [await read_image(image) for image in images]
+
+
+async def _request_images(data):
+    with stage("decode"):
+        if isinstance(data, InpaintModification):
+            return await _input_images(
+                data.image and [data.image], data.image_id and [data.image_id], data.native_resolution
+            )
+        return await _input_images(data.images and data.images.value, data.image_ids, data.native_resolution)
+
+
+def _output(data):
+    format = data.output_format or OUTPUT_FORMAT
+    quality = (data.quality or OUTPUT_QUALITY) if format != "png" else None
+    return format, quality
+
+
+async def _generate(images, prompts, priority, data, raw=False, preview_tokens=None, reservation=None):
+    # Cached results are stored already encoded; only misses are enqueued,
+    # before this returns, so a full queue surfaces to the caller right
+    # away. Returns the coroutine that awaits and encodes the results
+    seed = DEFAULT_SEED if data.seed is None else data.seed
+    steps = data.steps or QUALITY_TIERS[data.tier or DEFAULT_TIER]
+    mask = mask_spec_key(data.mask.model_dump()) if data.mask is not None else None
+    format, quality = _output(data)
+    # Native resolution images are inpainted tile by tile and blended back
+    tiled = {"tiled": True} if data.native_resolution else {}
+    keys = []
+    encoded = [None] * len(images)
+    if results_cache is not None:
+        # Hashing full-size pixels takes a while; keep it off the event loop
+        keys = await asyncio.to_thread(lambda: [
+            result_key(
+                image, prompt, seed, steps, model_id=pipeline.model, mask=mask, format=format, quality=quality, **tiled
+            )
+            for image, prompt in zip(images, prompts)
+        ])
+        encoded = [await results_cache.get(key, format) for key in keys]
+    missing = [i for i, data in enumerate(encoded) if data is None]
+    futures = []
+    if missing:
+        # Streaming requests ask for a preview every PREVIEW_EVERY steps
+        streaming = {}
+        if preview_tokens:
+            streaming = {"previews": [preview_tokens[i] for i in missing], "preview_every": PREVIEW_EVERY}
+        futures = batcher.enqueue_many(
+            [images[i] for i in missing], [prompts[i] for i in missing], priority,
+            seeds=[seed] * len(missing), steps=steps, mask=mask, reservation=reservation, **tiled, **streaming
         )
+
+    async def _finish():
+        for i, future in zip(missing, futures):
+            # Queueing and diffusion, as seen by this request
+            with stage("inference"):
+                image = await future
+            with stage("encode"):
+                encoded[i] = image_to_bytes(image, format, quality)
+            if results_cache is not None:
+                await results_cache.put(keys[i], encoded[i], format)
+        if raw:
+            return encoded
+        return _results(encoded, prompts, format)
+
+    return _finish()
+
+
+async def _initial_design(data: OfficeDesignRequest, images, raw=False, reservation=None):
+    try:
+        prompts = await get_inpainting_prompts(llm, data)
+
+        if len(images) != len(prompts):
+            raise ValueError("Number of images and prompts must be equal.")
+
+        work = await _generate(images, prompts, BULK, data, raw=raw, reservation=reservation)
+    finally:
+        # Slots not taken by the enqueue (failures, cached results) go back
+        if reservation is not None:
+            reservation.release()
+    results = await work
+    return (results, prompts) if raw else results
+
+
+@app.post("/get-initial-design")
+async def process_images(
+    data: OfficeDesignRequest,
+    accept: str = Header(default=""),
+):
+    images = data.image_ids or (data.images.value if data.images else [])
+    if not batcher.has_capacity(len(images)):
+        return QUEUE_FULL
+
+    # Clients asking for image/* or multipart/mixed get raw bytes, skipping base64
+    raw = wants_binary(accept)
+    try:
+        pil_images = await _request_images(data)
+        results = await _initial_design(data, pil_images, raw=raw)
+    except asyncio.QueueFull:
+        return QUEUE_FULL
+    except LLMUnavailable as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if raw:
+        return binary_response(*results, format=_output(data)[0])
     return JSONResponse(content={"results": results})
 
 
 @app.post("/modify-design")
 async def modify_image(
+    data: InpaintModification,
+    accept: str = Header(default=""),
+):
+    raw = wants_binary(accept)
+    try:
+        pil_image, = await _request_images(data)
+        work = await _generate([pil_image], [data.prompt], INTERACTIVE, data, raw=raw)
+        results = await work
+    except asyncio.QueueFull:
+        return QUEUE_FULL
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if raw:
+        return binary_response(results, [data.prompt], format=_output(data)[0])
+    return JSONResponse(content={"results": results})
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/modify-design/stream")
+async def stream_modify_design(
     data: InpaintModification
 ):
-    image = data.image
-    prompt = data.prompt
-
-    pil_image = await read_image(image)
-    image = generate_inpainted_image(pipeline, pil_image, prompt)
-    image = encode_image(image)
-    results = []
-    results.append(
-        {
-            "image": image,
-            "prompt": prompt,
-        }
+    # Server-sent events: low-resolution "preview" events while diffusion
+    # runs, then one "result" (or "error") event with the final image
+    try:
+        pil_image, = await _request_images(data)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    token, updates = previews.subscribe()
+    try:
+        work = asyncio.ensure_future(await _generate([pil_image], [data.prompt], INTERACTIVE, data, preview_tokens=[token]))
+    except asyncio.QueueFull:
+        previews.unsubscribe(token)
+        return QUEUE_FULL
+
+    async def events():
+        try:
+            while not work.done():
+                update = asyncio.ensure_future(updates.get())
+                await asyncio.wait({work, update}, return_when=asyncio.FIRST_COMPLETED)
+                if not update.done():
+                    update.cancel()
+                    break
+                step, total, preview = update.result()
+                yield _event("preview", {
+                    "step": step,
+                    "total": total,
+                    "image": base64.b64encode(preview).decode("utf-8"),
+                    "format": "jpeg",
+                })
+            try:
+                yield _event("result", {"results": work.result()})
+            except Exception as e:
+                yield _event("error", {"error": str(e) or type(e).__name__})
+        finally:
+            previews.unsubscribe(token)
+            work.cancel()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    return JSONResponse(content={"results": results})
+
+
+@app.post("/jobs/get-initial-design", status_code=202)
+async def submit_initial_design(
+    data: OfficeDesignRequest
+):
+    # The images are only enqueued after the LLM call, so their slots are
+    # held from now on; a queue filling up meanwhile cannot fail the job
+    images = data.image_ids or (data.images.value if data.images else [])
+    reservation = batcher.reserve(len(images))
+    if reservation is None:
+        return QUEUE_FULL
+
+    job = None
+    try:
+        pil_images = await _request_images(data)
+        job = jobs.submit("get-initial-design", _initial_design(data, pil_images, reservation=reservation))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    finally:
+        # Once submitted, the job owns the slots
+        if job is None:
+            reservation.release()
+    return job.to_dict()
+
+
+@app.post("/jobs/modify-design", status_code=202)
+async def submit_modify_design(
+    data: InpaintModification
+):
+    try:
+        pil_image, = await _request_images(data)
+        work = await _generate([pil_image], [data.prompt], INTERACTIVE, data)
+    except asyncio.QueueFull:
+        return QUEUE_FULL
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    job = jobs.submit("modify-design", work)
+    return job.to_dict()
+
+
+@app.get("/ready")
+async def ready():
+    if executor is None:
+        status = pipeline.status()
+    elif not warming.done():
+        status = {"state": LOADING}
+    elif warming.cancelled() or warming.exception() is not None:
+        status = {"state": FAILED, "error": None if warming.cancelled() else str(warming.exception())}
+    else:
+        status = {"state": READY, "workers": warming.result()}
+    return JSONResponse(status_code=200 if status["state"] == READY else 503, content=status)
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    if results_cache is None:
+        return JSONResponse(status_code=404, content={"error": "Result cache is disabled."})
+    return results_cache.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown or expired job."})
+    return job.to_dict()
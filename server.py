@@ -1,20 +1,81 @@
+import asyncio
 import base64
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any, Literal, Optional, List
+from typing import Annotated, Dict, Any, Literal, Optional, List
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 import json
+import logging
 
 # Import your schema
 from schemas import OfficeInquiry, OfficeChangesForm
+from globalworth.catalog.facets import OfficeSearch
+from globalworth.catalog.store import OfficeCatalog
+from globalworth.llm.client import LLMClient
+from globalworth.llm.resilience import LLMUnavailable
+from globalworth.llm.vision import VisionPreprocessor, url_plan
+from globalworth.conversation.turn import fused_turn
+from globalworth.conversation.prompts import compact_form, fallback_question
+from globalworth.conversation.sessions import create_session_store
+from globalworth.conversation.extractor import extract_inquiry_fields_locally
+from globalworth.catalog.scoring import rank_buildings, rank_floors
+from globalworth.catalog.packing import cheapest_configurations
+from globalworth.catalog.parsing import parse_number
+from globalworth.assets.store import AssetStore
+from globalworth.inpainting.api import decode_base64
+from globalworth.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, stage
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+catalog = OfficeCatalog(os.getenv("TOWERS_DIR", "towers"))
+
+# Catalog images are ingested once and referred to by content-hash id
+assets = AssetStore.from_env()
+
+# Image tokens allowed per /get-initial-design/ call, split across its images
+VISION_TOKEN_BUDGET = int(os.getenv("VISION_TOKEN_BUDGET", "2400"))
+vision = VisionPreprocessor()
+
+# Only the best pre-scored candidates are sent to the LLM
+SHORTLIST_TOP_K = int(os.getenv("SHORTLIST_TOP_K", "5"))
+
+# Extract fields and ask the next question in a single completion per message
+FUSED_TURNS = os.getenv("FUSED_TURNS", "1") == "1"
+
+# Skip LLM extraction when the rule-based extractor explains the whole message
+LOCAL_EXTRACTION = os.getenv("LOCAL_EXTRACTION", "1") == "1"
+
+INQUIRY_TURN_PROMPT = "Jesteś pomocnym asystentem użytkownika, który pomaga wypełnić formularz zapytania ofertowego dotyczącego wynajmu przestrzeni biurowej. Na podstawie odpowiedzi użytkownika wypełnij odpowiednie pola formularza, a następnie zadaj pytanie, aby uzyskać część brakujących informacji. Nie pytaj o zbyt wiele informacji na raz (max 2-3 logicznie powiązane pytania, jeśli możliwe jest sformułowanie ich w jednym pytaniu). Nie informuj użytkownika o tym, że wypełnia formularz."
+
+DESIGN_TURN_PROMPT = "Jesteś pomocnym asystentem projektanta wnętrz, który pomaga klientowi określić preferencje dotyczące aranżacji biura. Na podstawie odpowiedzi użytkownika wypełnij odpowiednie pola formularza, a następnie zadaj pytanie, aby uzyskać część brakujących informacji. Nie pytaj o zbyt wiele informacji na raz. Nie informuj użytkownika o tym, że wypełnia formularz."
+
+def _report_ingest(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Catalog image ingest failed", exc_info=task.exception())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parse the tower files once and pick up edits in the background
+    catalog.load()
+    catalog.area_tables()
+    catalog.text_index()
+    catalog.facet_index()
+    catalog.start_watching(float(os.getenv("CATALOG_REFRESH_SECONDS", "2.0")))
+    ingest = asyncio.create_task(asyncio.to_thread(assets.ingest_paths, catalog_image_paths(catalog)))
+    ingest.add_done_callback(_report_ingest)
+    yield
+    ingest.cancel()
+    catalog.stop_watching()
+    await llm.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -23,18 +84,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
+
+llm = LLMClient.from_env()
 
-client = OpenAI()
+# Conversation state kept server-side; "memory" or "sqlite:///path/to/sessions.db"
+sessions = create_session_store(
+    os.getenv("SESSION_STORE", "memory"),
+    ttl=float(os.getenv("SESSION_TTL_SECONDS", "7200"))
+)
 
 class ConversationState(BaseModel):
     next_question: str
     inquiry_state: Dict[str, Any]
     conversation_completed: bool = False
+    session_id: Optional[str] = None
 
 class UserMessage(BaseModel):
     message: str
-    conversation_state: ConversationState
+    # Either the full state (stateless clients) or the id of a server-side session
+    conversation_state: Optional[ConversationState] = None
+    session_id: Optional[str] = None
+
+class SessionTurn(BaseModel):
+    session_id: str
+    next_question: Optional[str]
+    updated_fields: Dict[str, Any]
+    conversation_completed: bool
     
 class OfficeRecommendation(BaseModel):
     building_match: str
@@ -43,6 +121,13 @@ class OfficeRecommendation(BaseModel):
     office_images: List[str]
     recommendation_text: str
     is_short_term: bool
+    configuration: Optional[Dict[str, Any]] = None
+    # Asset ids of the images above, usable in place of base64 uploads
+    building_image_ids: List[str] = []
+    office_image_ids: List[str] = []
+
+class AssetUpload(BaseModel):
+    image: str
 
 def prepare_empty_form(schema: type[BaseModel]):
     inquiry = schema.model_json_schema()['properties']
@@ -50,7 +135,7 @@ def prepare_empty_form(schema: type[BaseModel]):
         inquiry[k]['value'] = None
     return inquiry
 
-def create_next_inquiry_question(inquiry: Dict[str, Any]) -> str:
+async def create_next_inquiry_question(inquiry: Dict[str, Any]) -> str:
     messages = [
         {
             "role": "system", 
@@ -58,18 +143,16 @@ def create_next_inquiry_question(inquiry: Dict[str, Any]) -> str:
         },
         {
             "role": "developer",
-            "content": str(inquiry)
+            "content": compact_form(inquiry)
         }
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
-    
-    return response.choices[0].message.content
+    try:
+        return await llm.complete_text("inquiry_question", messages)
+    except LLMUnavailable:
+        return fallback_question(inquiry)
 
-def extract_inquiry_fields(inquiry: Dict[str, Any], user_answer: str) -> Dict[str, Any]:
+async def extract_inquiry_fields(inquiry: Dict[str, Any], user_answer: str) -> Dict[str, Any]:
     messages = [
         {
             "role": "system", 
@@ -77,7 +160,7 @@ def extract_inquiry_fields(inquiry: Dict[str, Any], user_answer: str) -> Dict[st
         },
         {
             "role": "developer",
-            "content": str(inquiry)
+            "content": compact_form(inquiry)
         },
         {
             "role": "user",
@@ -85,13 +168,13 @@ def extract_inquiry_fields(inquiry: Dict[str, Any], user_answer: str) -> Dict[st
         }
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
+    response = await llm.complete_text(
+        "inquiry_extract",
+        messages,
         response_format={"type": "json_object"}
     )
     
-    return json.loads(response.choices[0].message.content)
+    return json.loads(response)
 
 def update_form(form_state: Dict[str, Any], response_dict: Dict[str, Any]) -> Dict[str, Any]:
     for k in response_dict:
@@ -106,7 +189,59 @@ def is_form_complete(form_state: Dict[str, Any]) -> bool:
             return False
     return True
 
-def find_inquiry_match(inquiry, towers_data, type=Literal['office', 'building']):
+async def take_turn(form_state, user_answer, schema, call_site, turn_prompt, extract, ask, local_extract=None):
+    local = local_extract(user_answer) if local_extract and LOCAL_EXTRACTION else None
+    if local is not None and local.covered:
+        fields, next_question = local.accepted(), None
+    else:
+        try:
+            # Fall back to separate extract and ask calls only when the fused response is invalid
+            fused = None
+            if FUSED_TURNS:
+                fused = await fused_turn(llm, call_site, turn_prompt, form_state, user_answer, schema)
+            if fused is None:
+                fields, next_question = await extract(form_state, user_answer), None
+            else:
+                fields, next_question = fused
+        except LLMUnavailable:
+            # Keep what the rule-based extractor understood; `ask` falls back too
+            fields, next_question = {}, None
+        if local is not None:
+            fields = {**local.accepted(), **fields}
+    
+    form_state = update_form(form_state, fields)
+    if is_form_complete(form_state):
+        return form_state, None
+    if next_question is None:
+        next_question = await ask(form_state)
+    return form_state, next_question
+
+def create_session(form: Literal['inquiry', 'design'], next_question: str) -> str:
+    return sessions.create({"form": form, "values": {}, "next_question": next_question, "completed": False})
+
+async def take_session_turn(user_input: UserMessage, form: Literal['inquiry', 'design'], schema, *turn_args) -> SessionTurn:
+    async with sessions.turn_lock(user_input.session_id):
+        session = sessions.get(user_input.session_id)
+        if session is None or session["form"] != form:
+            raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    
+        form_state = update_form(prepare_empty_form(schema), session["values"])
+        form_state, next_question = await take_turn(form_state, user_input.message, schema, *turn_args)
+    
+        # Only the fields that changed in this turn go back to the client
+        values = {k: v for k, v in parse_inquiry_dict(form_state).items() if v is not None}
+        updated_fields = {k: v for k, v in values.items() if session["values"].get(k) != v}
+        session.update(values=values, completed=next_question is None, next_question=next_question or session["next_question"])
+        sessions.put(user_input.session_id, session)
+    
+    return SessionTurn(
+        session_id=user_input.session_id,
+        next_question=next_question,
+        updated_fields=updated_fields,
+        conversation_completed=session["completed"]
+    )
+
+async def find_inquiry_match(inquiry, towers_data, type=Literal['office', 'building']):
     # Format the inquiry data for the prompt
     inquiry_description = format_inquiry_for_prompt(inquiry)
     
@@ -133,15 +268,35 @@ def find_inquiry_match(inquiry, towers_data, type=Literal['office', 'building'])
     Zwróć tylko odpowiedź w formacie JSON, bez dodatkowych komentarzy.
     """
     
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+    response = await llm.complete_text(
+        "inquiry_match",
+        [{"role": "user", "content": prompt}],
         response_format={"type": "json_object"}
     )
     
-    result = json.loads(response.choices[0].message.content)
+    with stage("json_parse"):
+        result = json.loads(response)
     return result
 
+def describe_match(candidate, type=Literal['office', 'building']):
+    # Recommendation text used when the pre-scoring is decisive and the LLM is skipped
+    parts = candidate.components
+    if type == 'building':
+        return f"Najlepiej dopasowanym budynkiem jest {candidate.building}. "
+    text = f"Proponujemy piętro {candidate.floor}"
+    if parts.get('offered_area'):
+        text += f" z powierzchnią {parts['offered_area']:.0f} m²"
+    if parts.get('monthly_cost'):
+        text += f" za około {parts['monthly_cost']:.0f} PLN netto miesięcznie"
+    return text + "."
+
+def describe_configuration(configuration):
+    units = ", ".join(f"{area} m² na piętrze {floor}" for floor, area in configuration.units)
+    return (
+        f"Proponujemy {units} (łącznie {configuration.total_area} m²) "
+        f"za {configuration.monthly_cost:.0f} PLN netto miesięcznie."
+    )
+
 def format_inquiry_for_prompt(inquiry):
     description = []
     
@@ -206,83 +361,49 @@ def extract_office_info(data):
 
     return offices
 
-def load_office_database(directory_path="towers"):
-    buildings = []
-    for filename in os.listdir(directory_path):
-        if filename.endswith('.json'):
-            with open(os.path.join(directory_path, filename), 'r', encoding='utf-8') as f:
-                buildings.append(json.load(f))
-    return buildings
-
 def parse_inquiry_dict(inquiry_state: Dict[str, Any]):
     return {k: v['value'] for k, v in inquiry_state.items()}
 
-def get_floor_images(towers, building_name, floor_number):
-    base64_images = []
-    
+MOCK_OFFICE_IMAGES = [
+    'office_mocks/space1/empty_office_3_1.png',
+    'office_mocks/space2/empty_office_3_2.png',
+    'office_mocks/space3/empty_office_3_3.png'
+]
+
+def get_floor_images(catalog, building_name, floor_number):
     if building_name == 'Quattro Business Park':
-    
-        for building in towers:
-            if building['budynek']['nazwa'] == building_name:
-                for floor in building['pietra']:
-                    if floor['numer'] == floor_number:
-                        image_paths = floor.get('zdjecia', [])
-                        
-                        return image_paths
-                        
-                        # for path in image_paths:
-                        #     path = os.path.join(os.getcwd(), path)
-                        #     try:
-                        #         with open(path, "rb") as image_file:
-                        #             encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                        #             base64_images.append(f"data:image/jpeg;base64,{encoded_string}")
-                        #     except FileNotFoundError:
-                        #         print(f"File not found: {path}")
-                        #         continue
-                        # return base64_images
+        floor = catalog.get_floor(building_name, floor_number)
+        if floor is not None:
+            return floor.images
     else:
-        image_paths = [
-            'office_mocks/space1/empty_office_3_1.png',
-            'office_mocks/space2/empty_office_3_2.png',
-            'office_mocks/space3/empty_office_3_3.png'
-        ]
-        return image_paths
-        # for path in image_paths:
-        #     try:
-        #         with open(path, "rb") as image_file:
-        #             encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-        #             base64_images.append(f"data:image/jpeg;base64,{encoded_string}")
-        #     except FileNotFoundError:
-        #         print(f"File not found: {path}")
-        #         continue
-                    
-        # return base64_images
-                
-def get_building_images(towers, building_name):
-    base64_images = []
-    
-    for building in towers:
-        if building['budynek']['nazwa'] == building_name:
-            image_paths = building['zdjecia'].get("zewnetrzne", [])
-            if not isinstance(image_paths, list):
-                image_paths = [image_paths]
+        return MOCK_OFFICE_IMAGES
                 
-            return image_paths
-            
-    #         for path in image_paths:
-    #             try:
-    #                 path = os.path.join(os.getcwd(), path)
-    #                 with open(path, "rb") as image_file:
-    #                     encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-    #                     base64_images.append(f"data:image/jpeg;base64,{encoded_string}")
-    #             except FileNotFoundError:
-    #                 print(f"File not found: {path}")
-    #                 continue
-    #         break
-            
-    # return base64_images
-        
-def create_next_design_question(form_state: Dict[str, Any]) -> str:
+def get_building_images(catalog, building_name):
+    building = catalog.get_building(building_name)
+    if building is not None:
+        return building.exterior_images
+
+def catalog_image_paths(catalog):
+    paths = [path for building in catalog.buildings() for path in building.exterior_images]
+    paths += [path for floor in catalog.floors() for path in floor.images]
+    paths += MOCK_OFFICE_IMAGES
+    return list(dict.fromkeys(paths))
+
+def load_office_image(image: Optional[str] = None, asset_id: Optional[str] = None):
+    # Image URLs go to the vision model as they are
+    if asset_id is None and isinstance(image, str) and image.startswith(("http://", "https://")):
+        return image
+    if asset_id is None:
+        try:
+            return decode_base64(image)
+        except (ValueError, TypeError, AttributeError):
+            raise HTTPException(status_code=400, detail="Invalid base64 image.")
+    data = assets.read(asset_id, "vision")
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"Unknown asset: {asset_id}")
+    return data
+
+async def create_next_design_question(form_state: Dict[str, Any]) -> str:
     messages = [
         {
             "role": "system", 
@@ -290,18 +411,16 @@ def create_next_design_question(form_state: Dict[str, Any]) -> str:
         },
         {
             "role": "developer",
-            "content": str(form_state)
+            "content": compact_form(form_state)
         }
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
-    
-    return response.choices[0].message.content
+    try:
+        return await llm.complete_text("design_question", messages)
+    except LLMUnavailable:
+        return fallback_question(form_state)
 
-def extract_design_fields(form_state: Dict[str, Any], user_answer: str) -> Dict[str, Any]:
+async def extract_design_fields(form_state: Dict[str, Any], user_answer: str) -> Dict[str, Any]:
     messages = [
         {
             "role": "system", 
@@ -309,7 +428,7 @@ def extract_design_fields(form_state: Dict[str, Any], user_answer: str) -> Dict[
         },
         {
             "role": "developer",
-            "content": str(form_state)
+            "content": compact_form(form_state)
         },
         {
             "role": "user",
@@ -317,20 +436,44 @@ def extract_design_fields(form_state: Dict[str, Any], user_answer: str) -> Dict[
         }
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
+    response = await llm.complete_text(
+        "design_extract",
+        messages,
         response_format={"type": "json_object"}
     )
     
-    return json.loads(response.choices[0].message.content)
+    return json.loads(response)
 
 @app.post("/get-initial-design/")
 async def get_initial_design(design_preferences: Dict[str, Any]):
     office_images = design_preferences.pop('office_images', [])
+    office_image_ids = design_preferences.pop('office_image_ids', [])
+    try:
+        budget = int(design_preferences.pop('vision_token_budget', VISION_TOKEN_BUDGET))
+    except (TypeError, ValueError):
+        budget = 0
+    if budget <= 0:
+        raise HTTPException(status_code=400, detail="vision_token_budget must be a positive integer.")
+    with stage("decode"):
+        if office_image_ids:
+            office_images = [load_office_image(asset_id=asset_id) for asset_id in office_image_ids]
+        else:
+            office_images = [load_office_image(image) for image in office_images]
     if not office_images:
         raise HTTPException(status_code=400, detail="No office images provided.")
     
+    # Resized to the tile geometry the vision model bills for
+    per_image = budget // len(office_images)
+    try:
+        with stage("vision_prepare"):
+            prepared = [
+                (image, url_plan(per_image)) if isinstance(image, str)
+                else await asyncio.to_thread(vision.prepare, image, per_image)
+                for image in office_images
+            ]
+    except OSError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+
     try:
         # Format preferences
         preferences_json = json.dumps(design_preferences, ensure_ascii=False, indent=2)
@@ -374,12 +517,12 @@ async def get_initial_design(design_preferences: Dict[str, Any]):
         ]
 
         # Add each image to the content
-        for i, base64_image in enumerate(office_images):
+        for i, (image_url, plan) in enumerate(prepared):
             content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"{base64_image}",
-                    "detail": "high"
+                    "url": image_url,
+                    "detail": plan.detail
                 }
             })
             content.append({
@@ -387,9 +530,9 @@ async def get_initial_design(design_preferences: Dict[str, Any]):
                 "text": f"Image {i + 1}: Empty office space to be designed."
             })
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        response = await llm.complete_text(
+            "initial_design",
+            [
                 {
                     "role": "user",
                     "content": content
@@ -398,8 +541,11 @@ async def get_initial_design(design_preferences: Dict[str, Any]):
             response_format={"type": "json_object"}
         )
 
-        result = json.loads(response.choices[0].message.content)
+        with stage("json_parse"):
+            result = json.loads(response)
         return result
+    except LLMUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": f"{llm.policy.breaker_cooldown:.0f}"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -407,12 +553,13 @@ async def get_initial_design(design_preferences: Dict[str, Any]):
 async def start_design():
     try:
         empty_form = prepare_empty_form(OfficeChangesForm)
-        initial_question = create_next_design_question(empty_form)
+        initial_question = await create_next_design_question(empty_form)
         
         initial_state = ConversationState(
             next_question=initial_question,
             inquiry_state=empty_form,
-            conversation_completed=False
+            conversation_completed=False,
+            session_id=create_session("design", initial_question)
         )
         
         return initial_state
@@ -422,26 +569,36 @@ async def start_design():
 @app.post("/parse-design-message/")
 async def parse_design_message(user_input: UserMessage):
     try:
+        if user_input.session_id:
+            return await take_session_turn(
+                user_input, "design", OfficeChangesForm,
+                "design_turn", DESIGN_TURN_PROMPT,
+                extract_design_fields, create_next_design_question
+            )
+        if user_input.conversation_state is None:
+            raise HTTPException(status_code=400, detail="Either session_id or conversation_state is required.")
+        
         # Extract current state
         conversation_state = user_input.conversation_state
         current_form = conversation_state.inquiry_state
         
-        # Extract information from user message
-        extracted_fields = extract_design_fields(current_form, user_input.message)
-        
-        # Update form state
-        updated_form = update_form(current_form, extracted_fields)
+        # Extract information from user message and ask for what is still missing
+        updated_form, next_question = await take_turn(
+            current_form, user_input.message, OfficeChangesForm,
+            "design_turn", DESIGN_TURN_PROMPT,
+            extract_design_fields, create_next_design_question
+        )
         conversation_state.inquiry_state = updated_form
         
         # Check if form is complete
-        if is_form_complete(updated_form):
+        if next_question is None:
             conversation_state.conversation_completed = True
         else:
-            # Generate next question
-            next_question = create_next_design_question(updated_form)
             conversation_state.next_question = next_question
         
         return conversation_state
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -449,23 +606,72 @@ async def parse_design_message(user_input: UserMessage):
 async def find_best_inquiry_match(inquiry_state: Dict[str, Any]):
     try:
         inquiry_dict = parse_inquiry_dict(inquiry_state)
-        towers = load_office_database()
         
         is_short_term = inquiry_dict.get('short_term_rental', False)
         
-        # Get building match
-        bmatches = find_inquiry_match(inquiry_dict, towers, "building")
-        best_building = bmatches['best_match']
-        building_text = bmatches['recommendation']
-        building_match = [tower for tower in towers if tower['budynek']['nazwa'] == best_building][0]
-        building_images = get_building_images(towers, best_building)
+        # Buildings that can fit the requested area within budget, using subdivisions across floors
+        requested_area = parse_number(inquiry_dict.get('office_area_m2'))
+        budget = parse_number(inquiry_dict.get('monthly_budget_net_PLN'))
+        feasible = None
+        with stage("scoring"):
+            if requested_area:
+                configurations = cheapest_configurations(list(catalog.area_tables().values()), requested_area, budget)
+                feasible = {c.building for c in configurations} or None
+            
+            # Get building match, with the preferred area matched against the buildings' location text
+            location = catalog.text_index().scores(str(inquiry_dict.get('preferred_district_or_area') or ''))
+            bshortlist = rank_buildings(
+                catalog.floor_matrix(), inquiry_dict, top_k=SHORTLIST_TOP_K, only=feasible, location=location
+            )
+        if not bshortlist.candidates:
+            raise HTTPException(status_code=404, detail="No offices in the catalog.")
+        if bshortlist.dominant:
+            best_building = bshortlist.best.building
+            building_text = describe_match(bshortlist.best, "building")
+        else:
+            shortlisted = [catalog.get_building(c.building).raw for c in bshortlist.candidates]
+            try:
+                bmatches = await find_inquiry_match(inquiry_dict, shortlisted, "building")
+                best_building = bmatches['best_match']
+                building_text = bmatches['recommendation']
+            except LLMUnavailable:
+                # The pre-scoring order stands in for the LLM's pick
+                best_building = bshortlist.best.building
+                building_text = describe_match(bshortlist.best, "building")
+        building_match = catalog.get_building(best_building)
+        if building_match is None:
+            raise HTTPException(status_code=404, detail=f"Unknown building: {best_building}")
+        building_images = get_building_images(catalog, best_building)
+        
+        # Get office match: an exact subdivision layout when one fits, else the best floor
+        configuration = None
+        if requested_area:
+            configuration = catalog.area_table(best_building).cheapest(requested_area, budget)
+        if configuration is not None:
+            best_office = ", ".join(str(floor) for floor in configuration.floors)
+            office_text = describe_configuration(configuration)
+        else:
+            oshortlist = rank_floors(catalog.floor_matrix(), inquiry_dict, best_building, top_k=SHORTLIST_TOP_K)
+            if oshortlist.dominant:
+                best_office = oshortlist.best.floor
+                office_text = describe_match(oshortlist.best, "office")
+            else:
+                floor_numbers = {c.floor for c in oshortlist.candidates}
+                offices = [o for o in extract_office_info(building_match.raw) if o['numer_pietra'] in floor_numbers]
+                try:
+                    omatches = await find_inquiry_match(inquiry_dict, offices, "office")
+                    best_office = omatches['best_match']
+                    office_text = omatches['recommendation']
+                except LLMUnavailable:
+                    best_office = oshortlist.best.floor
+                    office_text = describe_match(oshortlist.best, "office")
+        office_images = get_floor_images(
+            catalog, best_building, configuration.floors[0] if configuration else best_office
+        )
         
-        # Get office match
-        offices = extract_office_info(building_match)
-        omatches = find_inquiry_match(inquiry_dict, offices, "office")
-        best_office = omatches['best_match']
-        office_text = omatches['recommendation']
-        office_images = get_floor_images(towers, best_building, best_office)
+        with stage("assets"):
+            building_image_ids = await asyncio.to_thread(assets.ingest_paths, building_images)
+            office_image_ids = await asyncio.to_thread(assets.ingest_paths, office_images)
         
         response = OfficeRecommendation(
             building_match=str(best_building),
@@ -475,9 +681,14 @@ async def find_best_inquiry_match(inquiry_state: Dict[str, Any]):
             office_images=office_images,
             
             recommendation_text=building_text + office_text,
-            is_short_term=is_short_term
+            is_short_term=is_short_term,
+            configuration=configuration.to_dict() if configuration else None,
+            building_image_ids=building_image_ids,
+            office_image_ids=office_image_ids
         )
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -486,12 +697,13 @@ async def find_best_inquiry_match(inquiry_state: Dict[str, Any]):
 async def start_inquiry():
     try:
         empty_inquiry = prepare_empty_form(OfficeInquiry)
-        initial_question = create_next_inquiry_question(empty_inquiry)
+        initial_question = await create_next_inquiry_question(empty_inquiry)
         
         initial_state = ConversationState(
             next_question=initial_question,
             inquiry_state=empty_inquiry,
-            inquiry_completed=False
+            inquiry_completed=False,
+            session_id=create_session("inquiry", initial_question)
         )
         
         return initial_state
@@ -501,29 +713,113 @@ async def start_inquiry():
 @app.post("/parse-inquiry-message/")
 async def parse_inquiry_message(user_input: UserMessage):
     try:
+        if user_input.session_id:
+            return await take_session_turn(
+                user_input, "inquiry", OfficeInquiry,
+                "inquiry_turn", INQUIRY_TURN_PROMPT,
+                extract_inquiry_fields, create_next_inquiry_question,
+                extract_inquiry_fields_locally
+            )
+        if user_input.conversation_state is None:
+            raise HTTPException(status_code=400, detail="Either session_id or conversation_state is required.")
+        
         # Extract current state
         conversation_state = user_input.conversation_state
         current_inquiry = conversation_state.inquiry_state
         
-        # Extract information from user message
-        extracted_fields = extract_inquiry_fields(current_inquiry, user_input.message)
-        
-        # Update inquiry state
-        updated_inquiry = update_form(current_inquiry, extracted_fields)
+        # Extract information from user message and ask for what is still missing
+        updated_inquiry, next_question = await take_turn(
+            current_inquiry, user_input.message, OfficeInquiry,
+            "inquiry_turn", INQUIRY_TURN_PROMPT,
+            extract_inquiry_fields, create_next_inquiry_question,
+            extract_inquiry_fields_locally
+        )
         conversation_state.inquiry_state = updated_inquiry
         
         # Check if inquiry is complete
-        if is_form_complete(updated_inquiry):
+        if next_question is None:
             conversation_state.conversation_completed = True
         else:
-            # Generate next question
-            next_question = create_next_inquiry_question(updated_inquiry)
             conversation_state.next_question = next_question
         
         return conversation_state
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search-offices")
+async def search_offices(
+    params: Annotated[OfficeSearch, Query()],
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+):
+    # The ETag covers the catalog contents and the query, so it changes when
+    # a tower file is edited
+    index = catalog.facet_index()
+    etag = index.etag(params)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        with stage("search"):
+            result = index.search(params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(headers)
+    return result
+
+@app.get("/llm-cache/stats/")
+async def llm_cache_stats():
+    if llm.cache is None:
+        raise HTTPException(status_code=404, detail="LLM response cache is disabled.")
+    return llm.cache.stats()
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    schema = OfficeInquiry if session["form"] == "inquiry" else OfficeChangesForm
+    return ConversationState(
+        next_question=session["next_question"],
+        inquiry_state=update_form(prepare_empty_form(schema), session["values"]),
+        conversation_completed=session["completed"],
+        session_id=session_id
+    )
+
+@app.post("/assets/")
+async def upload_asset(upload: AssetUpload):
+    try:
+        content = base64.b64decode(upload.image.split(",", 1)[-1])
+        asset_id = await asyncio.to_thread(assets.ingest_bytes, content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    return assets.metadata(asset_id)
+
+@app.get("/assets/{asset_id}")
+async def get_asset(asset_id: str):
+    meta = assets.metadata(asset_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Unknown asset.")
+    return meta
+
+@app.get("/assets/{asset_id}/{derivative}")
+async def get_asset_derivative(asset_id: str, derivative: str, if_none_match: Optional[str] = Header(default=None)):
+    # Content never changes under an id, so clients may cache it indefinitely
+    etag = f'"{asset_id}-{derivative}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if if_none_match == etag and assets.exists(asset_id):
+        return Response(status_code=304, headers=headers)
+    path = await asyncio.to_thread(assets.path, asset_id, derivative)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown asset or derivative.")
+    return FileResponse(path, media_type=assets.media_type(asset_id, derivative), headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
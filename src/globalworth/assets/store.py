@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from globalworth.inpainting.api import image_to_bytes, open_image
+
+logger = logging.getLogger(__name__)
+
+ASSET_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _fit(image: Image.Image, box: int) -> Image.Image:
+    # Shrink (never enlarge) so the longer side fits in `box`
+    image.draft("RGB", (box, box))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    scale = min(1.0, box / max(image.size))
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, reducing_gap=3.0) if size != image.size else image
+
+
+def _vision(image: Image.Image) -> Image.Image:
+    # The geometry vision models bill "high" detail at: within 2048x2048,
+    # then the shorter side scaled down to 768
+    image = _fit(image, 2048)
+    scale = min(1.0, 768 / min(image.size))
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, reducing_gap=3.0) if size != image.size else image
+
+
+# name -> (builder, format, quality)
+DERIVATIVES = {
+    "inpaint": (open_image, "png", None),
+    "vision": (lambda content: _vision(Image.open(BytesIO(content))), "jpeg", 85),
+    "thumbnail": (lambda content: _fit(Image.open(BytesIO(content)), 320), "webp", 80),
+}
+
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+def asset_id(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+class AssetStore:
+    """Content-addressed image store.
+
+    Each image is stored once under the hash of its bytes, next to the
+    derivatives the services need (diffusion input, vision-model input and
+    a thumbnail), so clients can refer to it by id instead of re-uploading.
+    """
+
+    def __init__(self, directory: str = ".cache/assets"):
+        self.directory = directory
+        self._paths: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "AssetStore":
+        return cls(os.getenv("ASSETS_DIR", ".cache/assets"))
+
+    def _dir(self, asset_id: str) -> str:
+        return os.path.join(self.directory, asset_id[:2], asset_id)
+
+    def _write(self, path: str, data: bytes):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def ingest_bytes(self, content: bytes, source: Optional[str] = None) -> str:
+        key = asset_id(content)
+        directory = self._dir(key)
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            return key
+
+        with Image.open(BytesIO(content)) as image:
+            width, height = image.size
+            original_format = (image.format or "").lower()
+        os.makedirs(directory, exist_ok=True)
+        self._write(os.path.join(directory, "original"), content)
+        for name in DERIVATIVES:
+            self._derive(key, name, content)
+        meta = {
+            "id": key,
+            "width": width,
+            "height": height,
+            "format": original_format,
+            "bytes": len(content),
+            "source": source,
+        }
+        self._write(os.path.join(directory, "meta.json"), json.dumps(meta).encode("utf-8"))
+        return key
+
+    def ingest_path(self, path: str) -> Optional[str]:
+        # Catalog files are hashed once per (mtime, size)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logger.warning("Image %s does not exist", path)
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._paths.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            with open(path, "rb") as f:
+                key = self.ingest_bytes(f.read(), source=path)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Remembered like a good file, so it is not decoded again until it changes
+            logger.warning("Skipping image %s: %s", path, e)
+            key = None
+        with self._lock:
+            self._paths[path] = (signature, key)
+        return key
+
+    def ingest_paths(self, paths: List[str]) -> List[str]:
+        return [key for key in (self.ingest_path(path) for path in paths or []) if key is not None]
+
+    def _derive(self, key: str, name: str, content: bytes) -> str:
+        build, format, quality = DERIVATIVES[name]
+        path = os.path.join(self._dir(key), f"{name}.{EXTENSIONS[format]}")
+        if not os.path.exists(path):
+            self._write(path, image_to_bytes(build(content), format, quality))
+        return path
+
+    def exists(self, asset_id: str) -> bool:
+        return bool(ASSET_ID.match(asset_id)) and os.path.exists(os.path.join(self._dir(asset_id), "meta.json"))
+
+    def metadata(self, asset_id: str) -> Optional[dict]:
+        if not self.exists(asset_id):
+            return None
+        with open(os.path.join(self._dir(asset_id), "meta.json"), "rb") as f:
+            meta = json.load(f)
+        meta["derivatives"] = list(DERIVATIVES)
+        return meta
+
+    def path(self, asset_id: str, derivative: str = "original") -> Optional[str]:
+        if not self.exists(asset_id):
+            return None
+        original = os.path.join(self._dir(asset_id), "original")
+        if derivative == "original":
+            return original
+        if derivative not in DERIVATIVES:
+            return None
+        _, format, _ = DERIVATIVES[derivative]
+        path = os.path.join(self._dir(asset_id), f"{derivative}.{EXTENSIONS[format]}")
+        if not os.path.exists(path):
+            # Derivatives added after the asset was ingested are built on first use
+            with open(original, "rb") as f:
+                path = self._derive(asset_id, derivative, f.read())
+        return path
+
+    def read(self, asset_id: str, derivative: str = "original") -> Optional[bytes]:
+        path = self.path(asset_id, derivative)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def load_image(self, asset_id: str, derivative: str = "inpaint") -> Optional[Image.Image]:
+        data = self.read(asset_id, derivative)
+        if data is None:
+            return None
+        image = Image.open(BytesIO(data))
+        image.load()
+        return image
+
+    def media_type(self, asset_id: str, derivative: str) -> str:
+        if derivative in DERIVATIVES:
+            return MEDIA_TYPES[DERIVATIVES[derivative][1]]
+        meta = self.metadata(asset_id) or {}
+        return MEDIA_TYPES.get(meta.get("format"), "application/octet-stream")
@@ -0,0 +1,249 @@
+import base64
+import hashlib
+import json
+from datetime import date
+from typing import Dict, Iterable, List, Literal, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from globalworth.catalog.models import Building
+from globalworth.catalog.parsing import parse_area
+from globalworth.text import fold
+
+# Building-level facets, inherited by every floor. A floor matches a
+# multi-valued facet when it has all the selected values, a single-valued
+# one when it has any of them
+MULTI_VALUED = {"amenities", "office_types"}
+FACETS = ("building", "city", "amenities", "office_types", "parking_type")
+
+SORTS = ("building", "area", "-area", "price", "-price", "monthly_cost", "-monthly_cost", "available_from")
+
+
+class OfficeSearch(BaseModel):
+    building: List[str] = []
+    city: List[str] = []
+    amenities: List[str] = []
+    office_types: List[str] = []
+    parking_type: List[str] = []
+    accessible: Optional[bool] = None
+    available: Optional[bool] = None
+    # Free on or before this date
+    available_by: Optional[date] = None
+    min_area: Optional[float] = None
+    max_area: Optional[float] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    max_monthly_cost: Optional[float] = None
+    min_parking_spaces: Optional[int] = None
+    min_storage_m2: Optional[float] = None
+    sort: Literal[SORTS] = "building"
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None
+
+
+def _building_facets(building: Building) -> Dict[str, List[str]]:
+    raw = building.raw
+    return {
+        "building": [building.name],
+        "city": [building.city] if building.city else [],
+        "amenities": [str(a) for a in raw.get("udogodnienia", [])],
+        "office_types": [str(t) for t in raw.get("typ_biur", [])],
+        "parking_type": [raw["typ_parkingu"]] if raw.get("typ_parkingu") else [],
+    }
+
+
+def _range(values: np.ndarray):
+    present = values[~np.isnan(values)]
+    if not len(present):
+        return None
+    return {"min": float(present.min()), "max": float(present.max())}
+
+
+def _value(value) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+class FacetIndex:
+    """Bitmap indexes over catalog floors for filtered, faceted browsing.
+
+    Every facet value has a boolean row over all floors, so filters are
+    row ANDs/ORs and facet counts are one count per row against the other
+    filters' mask. Range fields are numpy columns; each sort order is a
+    precomputed rank, which also makes cursors a rank comparison.
+    """
+
+    def __init__(self, buildings: Iterable[Building]):
+        rows = []
+        for building in sorted(buildings, key=lambda b: b.name):
+            facets = _building_facets(building)
+            raw = building.raw
+            for floor in sorted(building.floors, key=lambda f: f.number):
+                rows.append((building, facets, raw, floor))
+        n = len(rows)
+        self.floors = [floor for _, _, _, floor in rows]
+        self._positions = {(f.building, f.number): i for i, f in enumerate(self.floors)}
+        self._buildings = {building.name: building for building, _, _, _ in rows}
+
+        self.area = np.array([f.area_m2 if f.area_m2 is not None else np.nan for f in self.floors])
+        self.price = np.array([f.price_per_m2 if f.price_per_m2 is not None else np.nan for f in self.floors])
+        self.monthly_cost = self.area * self.price
+        self.available = np.array([f.available for f in self.floors], dtype=bool)
+        self.available_from = np.array(
+            [f.available_from.toordinal() if f.available_from else np.nan for f in self.floors]
+        )
+        self.parking_spaces = np.array(
+            [float(raw.get("liczba_miejsc_parkingowych") or np.nan) for _, _, raw, _ in rows]
+        )
+        self.storage = np.array(
+            [parse_area(raw.get("powierzchnia_magazynowa")) or np.nan for _, _, raw, _ in rows]
+        )
+        self.accessible = np.array(
+            [bool(raw.get("dostepnosc_dla_osob_niepelnosprawnych")) for _, _, raw, _ in rows], dtype=bool
+        )
+
+        # facet -> (display values, value x floor bitmap, folded value -> row)
+        self.facets = {}
+        for name in FACETS:
+            values = sorted({value for _, facets, _, _ in rows for value in facets[name]})
+            lookup = {fold(value): i for i, value in enumerate(values)}
+            bitmap = np.zeros((len(values), n), dtype=bool)
+            for i, (_, facets, _, _) in enumerate(rows):
+                for value in facets[name]:
+                    bitmap[lookup[fold(value)], i] = True
+            self.facets[name] = (values, bitmap, lookup)
+
+        numbers = np.array([f.number for f in self.floors], dtype=np.float64)
+        names = np.array([f.building for f in self.floors], dtype=object)
+        self._ranks = {}
+        for sort in SORTS:
+            if sort == "building":
+                order = np.arange(n)
+            else:
+                column = getattr(self, sort.lstrip("-"))
+                key = -column if sort.startswith("-") else column
+                # Missing values last; ties keep catalog order
+                order = np.lexsort((numbers, names, np.nan_to_num(key, nan=np.inf)))
+            rank = np.empty(n, dtype=np.int64)
+            rank[order] = np.arange(n)
+            self._ranks[sort] = rank
+
+        self.fingerprint = hashlib.sha256(
+            json.dumps([f.model_dump(mode="json") for f in self.floors]
+                       + [self._buildings[name].raw for name in sorted(self._buildings)],
+                       sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.floors)
+
+    def etag(self, query: OfficeSearch) -> str:
+        digest = hashlib.sha256((self.fingerprint + query.model_dump_json()).encode()).hexdigest()[:24]
+        return f'"{digest}"'
+
+    def _facet_mask(self, name: str, selected: List[str]) -> Optional[np.ndarray]:
+        if not selected:
+            return None
+        _, bitmap, lookup = self.facets[name]
+        # Values not in the catalog match no floor
+        none = np.zeros(len(self), dtype=bool)
+        rows = np.array([bitmap[lookup[fold(value)]] if fold(value) in lookup else none for value in selected])
+        return rows.all(axis=0) if name in MULTI_VALUED else rows.any(axis=0)
+
+    def _range_mask(self, query: OfficeSearch) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        # NaN fails every comparison, so floors missing a bounded field drop out
+        with np.errstate(invalid="ignore"):
+            if query.min_area is not None:
+                mask &= self.area >= query.min_area
+            if query.max_area is not None:
+                mask &= self.area <= query.max_area
+            if query.min_price is not None:
+                mask &= self.price >= query.min_price
+            if query.max_price is not None:
+                mask &= self.price <= query.max_price
+            if query.max_monthly_cost is not None:
+                mask &= self.monthly_cost <= query.max_monthly_cost
+            if query.min_parking_spaces is not None:
+                mask &= self.parking_spaces >= query.min_parking_spaces
+            if query.min_storage_m2 is not None:
+                mask &= self.storage >= query.min_storage_m2
+        if query.accessible is not None:
+            mask &= self.accessible == query.accessible
+        if query.available is not None:
+            mask &= self.available == query.available
+        if query.available_by is not None:
+            mask &= self.available & ~(self.available_from > query.available_by.toordinal())
+        return mask
+
+    def _cursor_rank(self, query: OfficeSearch) -> int:
+        if query.cursor is None:
+            return -1
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(query.cursor.encode()))
+            position = self._positions[(cursor["building"], cursor["floor"])]
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid or stale cursor.")
+        if cursor.get("sort") != query.sort:
+            raise ValueError("Cursor belongs to a different sort order.")
+        return int(self._ranks[query.sort][position])
+
+    @staticmethod
+    def _cursor(floor, sort: str) -> str:
+        data = {"building": floor.building, "floor": floor.number, "sort": sort}
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+    def _result(self, i: int):
+        floor = self.floors[i]
+        building = self._buildings[floor.building]
+        return {
+            "building": floor.building,
+            "floor": floor.number,
+            "city": building.city,
+            "location": building.location,
+            "area_m2": floor.area_m2,
+            "price_per_m2": floor.price_per_m2,
+            "monthly_cost": _value(self.monthly_cost[i]),
+            "min_lease_months": floor.min_lease_months,
+            "available": floor.available,
+            "available_from": floor.available_from.isoformat() if floor.available_from else None,
+            "subdivisions": floor.subdivisions,
+            "images": floor.images,
+        }
+
+    def search(self, query: OfficeSearch) -> dict:
+        ranges = self._range_mask(query)
+        facet_masks = {name: self._facet_mask(name, getattr(query, name)) for name in FACETS}
+        matching = ranges.copy()
+        for mask in facet_masks.values():
+            if mask is not None:
+                matching &= mask
+
+        # A single-valued facet is counted without its own filter, so the
+        # counts show what selecting another value would add
+        counts = {}
+        for name, (values, bitmap, _) in self.facets.items():
+            base = matching
+            if name not in MULTI_VALUED and facet_masks[name] is not None:
+                base = ranges.copy()
+                for other, mask in facet_masks.items():
+                    if other != name and mask is not None:
+                        base &= mask
+            counts[name] = dict(zip(values, np.count_nonzero(bitmap & base, axis=1).tolist()))
+
+        rank = self._ranks[query.sort]
+        after = self._cursor_rank(query)
+        indices = np.flatnonzero(matching & (rank > after))
+        indices = indices[np.argsort(rank[indices], kind="stable")]
+        page = indices[: query.limit]
+        return {
+            "total": int(np.count_nonzero(matching)),
+            "results": [self._result(i) for i in page],
+            "next_cursor": self._cursor(self.floors[page[-1]], query.sort) if len(indices) > len(page) else None,
+            "facets": counts,
+            "ranges": {
+                "area_m2": _range(self.area[matching]),
+                "price_per_m2": _range(self.price[matching]),
+                "monthly_cost": _range(self.monthly_cost[matching]),
+            },
+        }
@@ -0,0 +1,81 @@
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from globalworth.catalog.parsing import parse_area, parse_date, parse_months, parse_price
+
+logger = logging.getLogger(__name__)
+
+
+class Floor(BaseModel):
+    building: str
+    number: int
+    area_m2: Optional[float] = None
+    price_per_m2: Optional[float] = None
+    min_lease_months: Optional[int] = None
+    available: bool = True
+    available_from: Optional[date] = None
+    subdivisions: List[int] = Field(default_factory=list)
+    images: List[str] = Field(default_factory=list)
+
+    @property
+    def monthly_cost(self) -> Optional[float]:
+        if self.area_m2 is None or self.price_per_m2 is None:
+            return None
+        return self.area_m2 * self.price_per_m2
+
+
+class Building(BaseModel):
+    name: str
+    address: Optional[str] = None
+    city: Optional[str] = None
+    location: Optional[str] = None
+    floors: List[Floor] = Field(default_factory=list)
+    exterior_images: List[str] = Field(default_factory=list)
+    source_file: Optional[str] = None
+    raw: Dict[str, Any] = Field(default_factory=dict, repr=False)
+
+
+def parse_floor(building_name: str, data: Dict[str, Any]) -> Floor:
+    # Tower files are not consistent: some use "dostepnosc" (bool) and
+    # "najkrotszy_okres_najmu", others "dostepnosc_od" (date) and
+    # "najkrotszy_okres_wynajmu".
+    min_lease = data.get("najkrotszy_okres_wynajmu", data.get("najkrotszy_okres_najmu"))
+    return Floor(
+        building=building_name,
+        number=int(data["numer"]),
+        area_m2=parse_area(data.get("powierzchnia")),
+        price_per_m2=parse_price(data.get("cena")),
+        min_lease_months=parse_months(min_lease),
+        available=bool(data.get("dostepnosc", True)),
+        available_from=parse_date(data.get("dostepnosc_od")),
+        subdivisions=[int(s) for s in data.get("wydzielenia", [])],
+        images=data.get("zdjecia", []),
+    )
+
+
+def parse_building(data: Dict[str, Any], source_file: Optional[str] = None) -> Building:
+    info = data.get("budynek", {})
+    name = info["nazwa"]
+    exterior = data.get("zdjecia", {}).get("zewnetrzne", [])
+    if not isinstance(exterior, list):
+        exterior = [exterior]
+    # One malformed floor is skipped rather than dropping the whole building
+    floors = []
+    for position, floor in enumerate(data.get("pietra", [])):
+        try:
+            floors.append(parse_floor(name, floor))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Skipping floor at position %d of %s: %r", position, name, e)
+    return Building(
+        name=name,
+        address=info.get("adres"),
+        city=info.get("miasto"),
+        location=info.get("lokalizacja"),
+        floors=floors,
+        exterior_images=exterior,
+        source_file=source_file,
+        raw=data,
+    )
@@ -0,0 +1,123 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from globalworth.catalog.models import Building
+
+# Floors with more subdivisions than this only offer single units, to keep
+# the per-floor subset enumeration bounded
+MAX_SUBSET_SUBDIVISIONS = 12
+
+Unit = Tuple[int, int]  # (floor number, area in m²)
+
+
+@dataclass(frozen=True)
+class Configuration:
+    building: str
+    total_area: int
+    monthly_cost: float
+    units: Tuple[Unit, ...]
+
+    @property
+    def floors(self) -> List[int]:
+        return sorted({floor for floor, _ in self.units})
+
+    def to_dict(self):
+        return {
+            "building": self.building,
+            "total_area_m2": self.total_area,
+            "monthly_cost_net_PLN": round(self.monthly_cost, 2),
+            "units": [{"floor": floor, "area_m2": area} for floor, area in self.units],
+        }
+
+
+class AreaTable:
+    """Cheapest way to rent at least N m² in one building.
+
+    Entries are sorted by area with costs strictly increasing, so the cheapest
+    configuration covering an area is the first entry at or above it.
+    """
+
+    def __init__(self, building: str, entries: List[Tuple[int, float, Tuple[Unit, ...]]]):
+        self.building = building
+        self.areas = [area for area, _, _ in entries]
+        self.entries = entries
+
+    def cheapest(self, area: float, budget: Optional[float] = None) -> Optional[Configuration]:
+        i = bisect_left(self.areas, area)
+        if i == len(self.entries):
+            return None
+        total_area, cost, units = self.entries[i]
+        if budget is not None and cost > budget:
+            return None
+        return Configuration(self.building, total_area, cost, units)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _floor_options(area: Optional[float], subdivisions: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+    # Every combination of subdivisions that fits on the floor, plus the whole floor
+    options = set()
+    if len(subdivisions) <= MAX_SUBSET_SUBDIVISIONS:
+        for size in range(1, len(subdivisions) + 1):
+            for combo in combinations(sorted(subdivisions), size):
+                if area is None or sum(combo) <= area:
+                    options.add(combo)
+    else:
+        options.update((s,) for s in subdivisions if area is None or s <= area)
+    if area is not None:
+        options.add((int(area),))
+    # One option per total area is enough: price per m² is per floor
+    by_area = {}
+    for combo in options:
+        by_area.setdefault(sum(combo), combo)
+    return list(by_area.values())
+
+
+def _pareto(table: Dict[int, Tuple[float, Tuple[Unit, ...]]]):
+    # Drop entries that cost at least as much as a larger one
+    entries = []
+    best_cost = float("inf")
+    for area in sorted(table, reverse=True):
+        cost, units = table[area]
+        if cost < best_cost:
+            entries.append((area, cost, units))
+            best_cost = cost
+    entries.reverse()
+    return entries
+
+
+@lru_cache(maxsize=4096)
+def _build_entries(floors: Tuple[Tuple[int, Optional[float], float, Tuple[int, ...]], ...]):
+    table: Dict[int, Tuple[float, Tuple[Unit, ...]]] = {0: (0.0, ())}
+    for number, area, price, subdivisions in floors:
+        options = _floor_options(area, subdivisions)
+        updated = dict(table)
+        for total, (cost, units) in table.items():
+            for combo in options:
+                new_total = total + sum(combo)
+                new_cost = cost + sum(combo) * price
+                if new_total not in updated or new_cost < updated[new_total][0]:
+                    updated[new_total] = (new_cost, units + tuple((number, s) for s in combo))
+        table = {area: (cost, units) for area, cost, units in _pareto(updated)}
+    table.pop(0, None)
+    return tuple(_pareto(table))
+
+
+def building_table(building: Building) -> AreaTable:
+    # Keyed on floor contents, so unchanged buildings stay cached across reloads
+    floors = tuple(
+        (f.number, f.area_m2, f.price_per_m2, tuple(f.subdivisions))
+        for f in building.floors
+        if f.available and f.price_per_m2 is not None and (f.area_m2 or f.subdivisions)
+    )
+    return AreaTable(building.name, list(_build_entries(floors)))
+
+
+def cheapest_configurations(tables: List[AreaTable], area: float, budget: Optional[float] = None, limit: Optional[int] = None) -> List[Configuration]:
+    configurations = [c for c in (t.cheapest(area, budget) for t in tables) if c is not None]
+    configurations.sort(key=lambda c: (c.monthly_cost, c.total_area))
+    return configurations[:limit] if limit else configurations
@@ -0,0 +1,48 @@
+import re
+from datetime import date, datetime
+from typing import Optional
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def parse_number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value).replace(" ", ""))
+    if match is None:
+        return None
+    return float(match.group().replace(",", "."))
+
+
+def parse_area(value) -> Optional[float]:
+    # "1300 m²" -> 1300.0
+    return parse_number(value)
+
+
+def parse_price(value) -> Optional[float]:
+    # "57 PLN/m²" -> 57.0
+    return parse_number(value)
+
+
+def parse_months(value) -> Optional[int]:
+    # "12 miesiecy", "3 miesiace", "1 rok" -> months
+    number = parse_number(value)
+    if number is None:
+        return None
+    if isinstance(value, str) and re.search(r"\b(rok|lat)", value.lower()):
+        number *= 12
+    return int(number)
+
+
+def parse_date(value) -> Optional[date]:
+    # "01.05.2025" or "2025-05-01"
+    if not value or not isinstance(value, str):
+        return None
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,224 @@
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from globalworth.catalog.models import Floor
+from globalworth.catalog.parsing import parse_date, parse_number
+
+DEFAULT_WEIGHTS = {
+    "area": 3.0,
+    "budget": 3.0,
+    "lease": 2.0,
+    "availability": 1.5,
+    "floor": 0.5,
+    "location": 2.0,
+}
+
+# Lease length assumed when the inquiry has a start date but no end date
+OPEN_ENDED_LEASE_MONTHS = 120
+
+
+@dataclass
+class Candidate:
+    building: str
+    floor: Optional[int]
+    score: float
+    components: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class Shortlist:
+    candidates: List[Candidate]
+    min_score: float = 0.75
+    min_margin: float = 0.15
+
+    @property
+    def best(self) -> Optional[Candidate]:
+        return self.candidates[0] if self.candidates else None
+
+    @property
+    def dominant(self) -> bool:
+        # The deterministic ranking is confident enough to skip the LLM
+        if not self.candidates or self.candidates[0].score < self.min_score:
+            return False
+        if len(self.candidates) == 1:
+            return True
+        return self.candidates[0].score - self.candidates[1].score >= self.min_margin
+
+
+class FloorMatrix:
+    """Column-oriented view of all catalog floors for vectorized scoring."""
+
+    def __init__(self, floors: List[Floor]):
+        self.floors = floors
+        n = len(floors)
+        self.buildings = np.array([f.building for f in floors], dtype=object)
+        self.numbers = np.array([f.number for f in floors], dtype=np.float64)
+        self.area = np.array([_nan(f.area_m2) for f in floors], dtype=np.float64)
+        self.price = np.array([_nan(f.price_per_m2) for f in floors], dtype=np.float64)
+        self.min_lease = np.array([_nan(f.min_lease_months) for f in floors], dtype=np.float64)
+        self.available = np.array([f.available for f in floors], dtype=bool)
+        self.available_from = np.array(
+            [f.available_from.toordinal() if f.available_from else np.nan for f in floors],
+            dtype=np.float64,
+        )
+        # Rentable units per floor: every subdivision plus the whole floor, NaN-padded
+        width = max([len(f.subdivisions) for f in floors] + [0]) + 1
+        self.units = np.full((n, width), np.nan)
+        for i, f in enumerate(floors):
+            self.units[i, : len(f.subdivisions)] = f.subdivisions
+            self.units[i, -1] = self.area[i]
+
+    def __len__(self):
+        return len(self.floors)
+
+
+def _nan(value):
+    return np.nan if value is None else float(value)
+
+
+def _inquiry_months(start: Optional[date], end: Optional[date]) -> Optional[float]:
+    if start is None:
+        return None
+    if end is None:
+        return OPEN_ENDED_LEASE_MONTHS
+    return max((end - start).days / 30.44, 0.0)
+
+
+def _floor_target(preference, numbers: np.ndarray):
+    # Returns the preferred floor number (or None for "any")
+    if preference is None:
+        return None
+    number = parse_number(preference)
+    if number is not None:
+        return number
+    text = str(preference).lower()
+    if "parter" in text:
+        return 0.0
+    if re.search(r"wysok|najwy|ostatni|high|top", text):
+        return float(np.nanmax(numbers)) if len(numbers) else None
+    if re.search(r"nisk|low", text):
+        return float(np.nanmin(numbers)) if len(numbers) else None
+    return None
+
+
+def score_floors(
+    matrix: FloorMatrix, inquiry: Dict, weights: Optional[Dict[str, float]] = None,
+    location: Optional[Dict[str, float]] = None,
+) -> Dict[str, np.ndarray]:
+    # `location` maps buildings to text relevance for the preferred area (see
+    # text_index); buildings it leaves out are taken not to match
+    weights = weights or DEFAULT_WEIGHTS
+    n = len(matrix)
+    ones = np.ones(n)
+    components = {}
+
+    # Area: smallest unit that covers the requested area, else the largest one
+    requested = parse_number(inquiry.get("office_area_m2"))
+    with np.errstate(invalid="ignore"):
+        if requested:
+            covering = np.where(matrix.units >= requested, matrix.units, np.nan)
+            offered = np.where(
+                np.isnan(covering).all(axis=1),
+                np.nanmax(np.nan_to_num(matrix.units, nan=-np.inf), axis=1),
+                np.nanmin(np.nan_to_num(covering, nan=np.inf), axis=1),
+            )
+            offered[np.isinf(offered)] = np.nan
+            ratio = offered / requested
+            components["area"] = np.nan_to_num(np.where(ratio >= 1, np.exp(-(ratio - 1)), ratio**2))
+        else:
+            offered = matrix.area
+            components["area"] = ones
+
+    # Budget: monthly rent of the offered unit vs. the monthly budget
+    budget = parse_number(inquiry.get("monthly_budget_net_PLN"))
+    cost = matrix.price * offered
+    if budget:
+        over = np.clip((cost - budget) / budget, 0, None)
+        components["budget"] = np.nan_to_num(np.exp(-3 * over), nan=0.5)
+    else:
+        components["budget"] = ones
+
+    # Lease: the requested period must cover the minimum lease term
+    start = parse_date(inquiry.get("rental_period_start"))
+    end = parse_date(inquiry.get("rental_period_end"))
+    months = _inquiry_months(start, end)
+    if inquiry.get("short_term_rental") and (months is None or months == OPEN_ENDED_LEASE_MONTHS):
+        months = 6
+    if months is not None:
+        shortfall = np.clip((matrix.min_lease - months) / np.maximum(matrix.min_lease, 1), 0, None)
+        components["lease"] = np.nan_to_num(np.exp(-4 * shortfall), nan=1.0)
+    else:
+        components["lease"] = ones
+
+    # Availability: penalize floors that free up after the requested start
+    if start is not None:
+        late_days = np.clip(matrix.available_from - start.toordinal(), 0, None)
+        availability = np.where(np.isnan(late_days), 1.0, np.exp(-late_days / 60))
+    else:
+        availability = ones.copy()
+    components["availability"] = np.where(matrix.available, availability, 0.0)
+
+    # Floor preference
+    target = _floor_target(inquiry.get("preferred_floor"), matrix.numbers)
+    if target is not None:
+        components["floor"] = np.exp(-np.abs(matrix.numbers - target) / 3)
+    else:
+        components["floor"] = ones
+
+    # Location, relative to the best matching building
+    if location:
+        best = max(location.values())
+        components["location"] = np.array([location.get(b, 0.0) / best for b in matrix.buildings])
+
+    total_weight = sum(weights.get(name, 0.0) for name in components)
+    total = sum(weights.get(name, 0.0) * values for name, values in components.items())
+    components["total"] = total / total_weight if total_weight else ones
+    components["offered_area"] = offered
+    components["monthly_cost"] = cost
+    return components
+
+
+def _candidate(matrix: FloorMatrix, scores: Dict[str, np.ndarray], i: int) -> Candidate:
+    return Candidate(
+        building=matrix.buildings[i],
+        floor=int(matrix.numbers[i]),
+        score=float(scores["total"][i]),
+        components={
+            name: (None if math.isnan(values[i]) else float(values[i]))
+            for name, values in scores.items()
+            if name != "total"
+        },
+    )
+
+
+def rank_buildings(matrix: FloorMatrix, inquiry: Dict, top_k: int = 5, only: Optional[Set[str]] = None, **kwargs) -> Shortlist:
+    weights = kwargs.pop("weights", None)
+    location = kwargs.pop("location", None)
+    if not len(matrix):
+        return Shortlist([], **kwargs)
+    scores = score_floors(matrix, inquiry, weights, location)
+    # Best floor per building, buildings ordered by that floor's score
+    order = np.argsort(-scores["total"], kind="stable")
+    seen = set()
+    candidates = []
+    for i in order:
+        if matrix.buildings[i] in seen or (only is not None and matrix.buildings[i] not in only):
+            continue
+        seen.add(matrix.buildings[i])
+        candidates.append(_candidate(matrix, scores, i))
+        if len(candidates) == top_k:
+            break
+    return Shortlist(candidates, **kwargs)
+
+
+def rank_floors(matrix: FloorMatrix, inquiry: Dict, building: str, top_k: int = 5, **kwargs) -> Shortlist:
+    weights = kwargs.pop("weights", None)
+    scores = score_floors(matrix, inquiry, weights)
+    indices = np.flatnonzero(matrix.buildings == building)
+    order = indices[np.argsort(-scores["total"][indices], kind="stable")][:top_k]
+    return Shortlist([_candidate(matrix, scores, i) for i in order], **kwargs)
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from globalworth.catalog.facets import FacetIndex
+from globalworth.catalog.models import Building, Floor, parse_building
+from globalworth.catalog.packing import AreaTable, building_table
+from globalworth.catalog.scoring import FloorMatrix
+from globalworth.catalog.text_index import TextIndex
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int = 0
+    # path -> ((mtime, size), building)
+    files: Dict[str, Tuple[Tuple[int, int], Building]] = field(default_factory=dict)
+    buildings: Dict[str, Building] = field(default_factory=dict)
+    floors: Dict[Tuple[str, int], Floor] = field(default_factory=dict)
+
+
+class OfficeCatalog:
+    """Parsed tower files kept in memory and indexed by building and floor.
+
+    Files are tracked by (mtime, size) so `refresh` only re-parses what changed.
+    Each reload builds a new `CatalogSnapshot` and publishes it in a single
+    assignment; derived indexes are cached against the snapshot they were
+    built from, so readers never see a half-updated catalog.
+    """
+
+    def __init__(self, directory: str = "towers"):
+        self.directory = directory
+        self._snapshot = CatalogSnapshot()
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._matrix: Optional[Tuple[CatalogSnapshot, FloorMatrix]] = None
+        self._area_tables: Optional[Tuple[CatalogSnapshot, Dict[str, AreaTable]]] = None
+        self._text_index: Optional[Tuple[CatalogSnapshot, TextIndex]] = None
+        self._facet_index: Optional[Tuple[CatalogSnapshot, FacetIndex]] = None
+        # path -> signature of tower files that failed to parse
+        self._failed: Dict[str, tuple] = {}
+
+    def load(self) -> "OfficeCatalog":
+        self.refresh()
+        return self
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def snapshot(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        with self._lock:
+            current = self._snapshot
+            seen = {}
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".json"):
+                        stat = entry.stat()
+                        seen[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+            # A file that failed to parse is retried only once its signature
+            # changes; meanwhile its last good version, if any, stays loaded
+            files = {}
+            failed = {}
+            changed = any(path not in seen for path in current.files)
+            for path, signature in seen.items():
+                known = current.files.get(path)
+                if known is not None and known[0] == signature:
+                    files[path] = known
+                    continue
+                if self._failed.get(path) != signature:
+                    try:
+                        with open(path, "r", encoding="utf-8") as f:
+                            files[path] = (signature, parse_building(json.load(f), source_file=path))
+                        changed = True
+                        continue
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.warning("Skipping tower file %s: %s", path, e)
+                failed[path] = signature
+                if known is not None:
+                    files[path] = known
+            self._failed = failed
+
+            if not changed:
+                return False
+
+            buildings = {}
+            floors = {}
+            for path in sorted(files):
+                building = files[path][1]
+                buildings[building.name] = building
+                for floor in building.floors:
+                    floors[(building.name, floor.number)] = floor
+
+            self._snapshot = CatalogSnapshot(current.version + 1, files, buildings, floors)
+            return True
+
+    def start_watching(self, interval: float = 2.0):
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def _watch():
+            while not self._stop.wait(interval):
+                try:
+                    if self.refresh():
+                        logger.info("Office catalog reloaded (version %d)", self.version)
+                except OSError as e:
+                    logger.warning("Office catalog refresh failed: %s", e)
+
+        self._watcher = threading.Thread(target=_watch, name="office-catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def buildings(self) -> List[Building]:
+        return list(self._snapshot.buildings.values())
+
+    def towers(self) -> List[dict]:
+        # Raw tower dicts, in the shape the LLM prompts expect
+        return [building.raw for building in self._snapshot.buildings.values()]
+
+    def get_building(self, name: str) -> Optional[Building]:
+        return self._snapshot.buildings.get(name)
+
+    def get_floor(self, building_name: str, floor_number) -> Optional[Floor]:
+        try:
+            return self._snapshot.floors.get((building_name, int(floor_number)))
+        except (TypeError, ValueError):
+            return None
+
+    def floors(self) -> List[Floor]:
+        return list(self._snapshot.floors.values())
+
+    def floor_matrix(self) -> FloorMatrix:
+        # Rebuilt lazily after each reload, from the snapshot read once here
+        snapshot = self._snapshot
+        cached = self._matrix
+        if cached is None or cached[0] is not snapshot:
+            cached = (snapshot, FloorMatrix(list(snapshot.floors.values())))
+            self._matrix = cached
+        return cached[1]
+
+    def area_tables(self) -> Dict[str, AreaTable]:
+        snapshot = self._snapshot
+        cached = self._area_tables
+        if cached is None or cached[0] is not snapshot:
+            cached = (snapshot, {b.name: building_table(b) for b in snapshot.buildings.values()})
+            self._area_tables = cached
+        return cached[1]
+
+    def text_index(self) -> TextIndex:
+        snapshot = self._snapshot
+        cached = self._text_index
+        if cached is None or cached[0] is not snapshot:
+            cached = (snapshot, TextIndex.build(list(snapshot.buildings.values())))
+            self._text_index = cached
+        return cached[1]
+
+    def facet_index(self) -> FacetIndex:
+        snapshot = self._snapshot
+        cached = self._facet_index
+        if cached is None or cached[0] is not snapshot:
+            cached = (snapshot, FacetIndex(list(snapshot.buildings.values())))
+            self._facet_index = cached
+        return cached[1]
+
+    def area_table(self, building_name: str) -> Optional[AreaTable]:
+        return self.area_tables().get(building_name)
+
+    def __len__(self):
+        return len(self._snapshot.buildings)
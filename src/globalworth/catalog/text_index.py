@@ -0,0 +1,104 @@
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from globalworth.catalog.models import Building
+from globalworth.text import terms
+
+# Field weights (BM25F-style): a term in the district name counts for more
+# than the same term in the neighbourhood description
+FIELD_WEIGHTS = {
+    "location": 3.0,
+    "address": 2.0,
+    "city": 1.0,
+    "description": 1.0,
+    "stops": 2.0,
+    "lines": 1.5,
+    "modes": 1.0,
+    "neighbours": 1.5,
+    "amenities": 1.0,
+    "services": 1.0,
+}
+
+K1 = 1.2
+B = 0.75
+
+
+def building_fields(raw: Dict) -> Dict[str, List[str]]:
+    """The location-related text of a tower file, by field."""
+    info = raw.get("budynek", {})
+    fields = {
+        "location": [info.get("lokalizacja") or ""],
+        "address": [info.get("adres") or ""],
+        "city": [info.get("miasto") or ""],
+        "description": [info.get("opis_okolicy") or ""],
+        "stops": [],
+        "lines": [],
+        "modes": [],
+        "neighbours": [n.get("nazwa_budynku", "") for n in raw.get("sasiedztwo", []) if isinstance(n, dict)],
+        "amenities": [str(a) for a in raw.get("udogodnienia", [])],
+        "services": [str(s) for s in raw.get("uslugi_w_budynku", [])],
+    }
+    for mode, stops in (raw.get("transport") or {}).items():
+        if stops:
+            fields["modes"].append(mode)
+        for stop in stops:
+            fields["stops"].append(stop.get("przystanek", ""))
+            fields["lines"].extend(str(line) for line in stop.get("linie", []))
+    return fields
+
+
+class TextIndex:
+    """In-memory BM25 index of buildings' location text.
+
+    Each posting holds its term's finished BM25 contribution, so a query is a
+    few dict lookups and additions per term. Text is folded and lightly
+    stemmed (see globalworth.text.terms) on both sides.
+    """
+
+    def __init__(self, postings: Dict[str, Dict[str, float]], size: int):
+        self._postings = postings
+        self.size = size
+
+    @classmethod
+    def build(cls, buildings: Iterable[Building]) -> "TextIndex":
+        frequencies: Dict[str, Dict[str, float]] = {}
+        lengths: Dict[str, float] = {}
+        for building in buildings:
+            counts: Dict[str, float] = defaultdict(float)
+            length = 0.0
+            for field, texts in building_fields(building.raw).items():
+                weight = FIELD_WEIGHTS[field]
+                for text in texts:
+                    for term in terms(text):
+                        counts[term] += weight
+                        length += weight
+            frequencies[building.name] = counts
+            lengths[building.name] = length
+
+        size = len(frequencies)
+        average = sum(lengths.values()) / size if size else 0.0
+        documents: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for name, counts in frequencies.items():
+            for term, tf in counts.items():
+                documents[term][name] = tf
+
+        postings = {}
+        for term, tfs in documents.items():
+            idf = math.log(1 + (size - len(tfs) + 0.5) / (len(tfs) + 0.5))
+            postings[term] = {
+                name: idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths[name] / average))
+                for name, tf in tfs.items()
+            }
+        return cls(postings, size)
+
+    def scores(self, query: str) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for term in set(terms(query)):
+            for name, score in self._postings.get(term, {}).items():
+                totals[name] = totals.get(name, 0.0) + score
+        return totals
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        ranked = sorted(self.scores(query).items(), key=lambda item: -item[1])
+        return ranked[:top_k]
@@ -0,0 +1,313 @@
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from globalworth.text import fold
+
+# Fields accepted without asking the LLM must reach this confidence
+MIN_CONFIDENCE = 0.8
+
+_UNITS = {
+    "zero": 0, "jeden": 1, "jedna": 1, "jedno": 1, "jednego": 1, "dwa": 2, "dwie": 2, "dwoch": 2,
+    "trzy": 3, "trzech": 3, "cztery": 4, "czterech": 4, "piec": 5, "pieciu": 5, "szesc": 6,
+    "szesciu": 6, "siedem": 7, "siedmiu": 7, "osiem": 8, "osmiu": 8, "dziewiec": 9, "dziewieciu": 9,
+}
+_TEENS = {
+    "dziesiec": 10, "dziesieciu": 10, "jedenascie": 11, "jedenastu": 11, "dwanascie": 12,
+    "dwunastu": 12, "trzynascie": 13, "trzynastu": 13, "czternascie": 14, "czternastu": 14,
+    "pietnascie": 15, "pietnastu": 15, "szesnascie": 16, "szesnastu": 16, "siedemnascie": 17,
+    "siedemnastu": 17, "osiemnascie": 18, "osiemnastu": 18, "dziewietnascie": 19, "dziewietnastu": 19,
+}
+_TENS = {
+    "dwadziescia": 20, "dwudziestu": 20, "trzydziesci": 30, "trzydziestu": 30, "czterdziesci": 40,
+    "czterdziestu": 40, "piecdziesiat": 50, "piecdziesieciu": 50, "szescdziesiat": 60,
+    "szescdziesieciu": 60, "siedemdziesiat": 70, "siedemdziesieciu": 70, "osiemdziesiat": 80,
+    "osiemdziesieciu": 80, "dziewiecdziesiat": 90, "dziewiecdziesieciu": 90,
+}
+_HUNDREDS = {
+    "sto": 100, "stu": 100, "dwiescie": 200, "dwustu": 200, "trzysta": 300, "trzystu": 300,
+    "czterysta": 400, "czterystu": 400, "piecset": 500, "pieciuset": 500, "szescset": 600,
+    "szesciuset": 600, "siedemset": 700, "siedmiuset": 700, "osiemset": 800, "osmiuset": 800,
+    "dziewiecset": 900, "dziewieciuset": 900,
+}
+_NUMBER_WORDS = {**_UNITS, **_TEENS, **_TENS, **_HUNDREDS}
+_MULTIPLIERS = {"tysiac": 1000, "tysiace": 1000, "tysiecy": 1000, "milion": 10**6, "miliony": 10**6, "milionow": 10**6}
+_FRACTIONS = {"pol": 0.5, "poltora": 1.5}
+
+_MONTHS = [
+    ("styczn", 1), ("styczen", 1), ("lut", 2), ("marc", 3), ("marzec", 3), ("kwietn", 4), ("kwiecien", 4),
+    ("maj", 5), ("czerwc", 6), ("czerwiec", 6), ("lipc", 7), ("lipiec", 7), ("sierpn", 8),
+    ("sierpien", 8), ("wrzesn", 9), ("wrzesien", 9), ("pazdziernik", 10), ("listopad", 11),
+    ("grudn", 12), ("grudzien", 12),
+]
+_MONTH = r"(styczn\w*|styczen|lut\w*|marc\w*|marzec|kwietn\w*|kwiecien|maj[au]?\b|czerwc\w*|czerwiec|lipc\w*|lipiec|sierpn\w*|sierpien|wrzesn\w*|wrzesien|pazdziernik\w*|listopad\w*|grudn\w*|grudzien)"
+
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+_WORD_RUN = re.compile(r"\b(?:(?:%s)\b\s*)+" % "|".join(sorted({**_NUMBER_WORDS, **_MULTIPLIERS}, key=len, reverse=True)))
+_FRACTION = re.compile(r"\b(poltora|pol)\b")
+_THOUSANDS_SEPARATOR = re.compile(r"(?<=\d)[  ](?=\d{3}\b)")
+_SCALED = re.compile(_NUMBER + r"\s*(tys\.?|tysiac\w*|tysiec\w*|k|mln\.?|milion\w*)(?=\W|$)")
+
+_AREA = re.compile(_NUMBER + r"\s*(m2|m²|m\^2|mkw|metr\w*|m)(?=\W|$)(?!\s*/)")
+_EMPLOYEES = re.compile(r"(\d+)\s*(osob\w*|osoby|osoba|os\.|pracownik\w*|stanowisk\w*|ludzi|person\w*)")
+# A price per square metre ("50 zl/m2", "50 pln za metr") is not a monthly budget
+_PER_M2 = r"\s*(?:/|za)\s*(?:m2|m²|m\^2|mkw\w*|metr\w*|m\b)"
+_BUDGET_CURRENCY = re.compile(_NUMBER + r"\s*(zl\b|zlotych|pln)(?!" + _PER_M2 + ")")
+# (?![\d.,]) keeps the number whole, so the guards cannot be dodged by
+# matching a shorter prefix of it
+_BUDGET_KEYWORD = re.compile(
+    r"budzet\w*\s+(?:\w+\s+){0,3}?" + _NUMBER
+    + r"(?![\d.,])(?!\s*(?:m2|m²|m\b|osob|os\.|pracownik))(?!\s*(?:zl\b|zlotych|pln)?" + _PER_M2 + ")"
+)
+_YEARLY = re.compile(r"^\W*(rocznie|na rok|/\s*rok|za rok|w skali roku)")
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_DOTTED_DATE = re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](\d{4})\b")
+_DAY_MONTH = re.compile(r"\b(\d{1,2})\s+" + _MONTH + r"(?:\s+(\d{4}))?")
+_MONTH_YEAR = re.compile(r"\b" + _MONTH + r"(?:\s+(\d{4}))?")
+_START_CUE = re.compile(r"(\bod|start\w*|rozpocz\w*|poczawszy|zaczyna\w*|wprowadz\w*)\W*(\w+\W+){0,2}$")
+_END_CUE = re.compile(r"(\bdo|konc\w*|zakoncz\w*|koniec)\W*(\w+\W+){0,2}$")
+# What may sit between a budget or headcount and a "na miesiac" that belongs to it
+_RATE_GAP = re.compile(r"[\s,]*(?:(?:zl|pln|zlotych|netto|brutto)\b[\s,]*)*")
+_DURATION = re.compile(r"\bna\s+(?:okres\s+)?" + _NUMBER + r"?\s*(miesi\w*|mies\.?|rok\w*|lat\w*)")
+
+_SHORT_TERM = re.compile(r"krotkoterminow\w*|krotki\w* (okres|termin)\w*")
+_LONG_TERM = re.compile(r"dlugoterminow\w*|dlugi\w* (okres|termin)\w*")
+_NEGATION = re.compile(r"\bnie\b\W*(\w+\W+){0,2}$")
+
+_ALWAYS_OPEN = re.compile(r"24\s*/\s*7|24\s*h\b|calodobow\w*|cala dobe|bez ograniczen")
+_BUSINESS_HOURS = re.compile(r"godzin\w* (pracy|biurow\w*)|standardow\w* godzin\w*")
+_HOUR_RANGE = re.compile(r"(?:godz\w*\s+)?(?:od\s+)?(\d{1,2})(?::(\d{2}))?\s*(?:-|do)\s*(\d{1,2})(?::(\d{2}))?")
+
+# Words that carry no form information on their own
+_FILLER = set("""
+potrzebuje potrzebujemy szukam szukamy chce chcemy chcialbym chcialabym chcielibysmy interesuje
+interesuja biuro biura biurze biur powierzchnia powierzchni powierzchnie przestrzen przestrzeni
+lokal lokalu na dla do od oraz ale lub albo zeby aby jak ktore ktory ktora tak
+okolo ok mniej wiecej niz maksymalnie max minimum min conajmniej najmniej najwyzej mniej
+najlepiej pomiescilo pomiescil pomiesci pomiescic zmiescilo zmiesci mamy mam jest sa to nas nam
+my budzet budzetem budzetu miesiecznie netto brutto miesiac miesiecy miesiace miesiecznego
+prosze dziekuje dzieki hej dzien dobry witam nasz nasza naszego nasze naszej firma firmy firmie
+zespol zespolu najmu najem wynajac wynajem wynajmu wynajecia rozpoczecie rozpoczac start data
+zakonczenie okres okresu umowa umowy umowe godziny godzinach dostepu dostep potrzebny potrzebne
+potrzebna bedzie byloby bedziemy fajnie super roku rok lat lata teraz obecnie chcialoby rocznie
+""".split())
+
+
+@dataclass
+class Extraction:
+    fields: Dict[str, Any] = field(default_factory=dict)
+    confidence: Dict[str, float] = field(default_factory=dict)
+    # True when nothing in the message is left unexplained by the extracted fields
+    covered: bool = False
+
+    def accepted(self, min_confidence: float = MIN_CONFIDENCE) -> Dict[str, Any]:
+        return {k: v for k, v in self.fields.items() if self.confidence[k] >= min_confidence}
+
+
+def _words_to_number(words: List[str]) -> float:
+    total = 0
+    current = 0
+    for word in words:
+        if word in _MULTIPLIERS:
+            total += max(current, 1) * _MULTIPLIERS[word]
+            current = 0
+        else:
+            current += _NUMBER_WORDS[word]
+    return total + current
+
+
+def normalize_numbers(text: str) -> str:
+    """Folds the text and rewrites Polish number words and scales as digits.
+
+    "sto dwadziescia metrow" -> "120 metrow", "50 tys. zl" -> "50000 zl"
+    """
+    text = fold(text)
+    text = _FRACTION.sub(lambda m: str(_FRACTIONS[m.group(1)]), text)
+    text = _WORD_RUN.sub(lambda m: "%d " % _words_to_number(m.group().split()), text)
+    text = _THOUSANDS_SEPARATOR.sub("", text)
+
+    def _scale(m):
+        unit = m.group(2)
+        factor = 10**6 if unit.startswith("m") else 1000
+        return "%g" % (float(m.group(1).replace(",", ".")) * factor)
+
+    return _SCALED.sub(_scale, text)
+
+
+def _to_number(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def _month_number(word: str) -> Optional[int]:
+    for prefix, number in _MONTHS:
+        if word.startswith(prefix):
+            return number
+    return None
+
+
+def _make_date(year: Optional[int], month: int, day: int, today: date) -> Optional[date]:
+    try:
+        candidate = date(year or today.year, month, day)
+    except ValueError:
+        return None
+    if year is None and candidate < today:
+        candidate = candidate.replace(year=today.year + 1)
+    return candidate
+
+
+def _add_months(start: date, months: float) -> date:
+    whole = int(round(months))
+    month = start.month - 1 + whole
+    year = start.year + month // 12
+    month = month % 12 + 1
+    day = min(start.day, 28)
+    return date(year, month, day)
+
+
+def _find_dates(text: str, today: date) -> List[Tuple[int, int, date, float, bool]]:
+    # (start, end, date, confidence, whether the year was given)
+    found = []
+    taken = []
+
+    def _add(m, value, confidence, year=True):
+        if value is None or any(s < m.end() and m.start() < e for s, e in taken):
+            return
+        taken.append(m.span())
+        found.append((m.start(), m.end(), value, confidence, bool(year)))
+
+    for m in _ISO_DATE.finditer(text):
+        _add(m, _make_date(int(m.group(1)), int(m.group(2)), int(m.group(3)), today), 0.95)
+    for m in _DOTTED_DATE.finditer(text):
+        _add(m, _make_date(int(m.group(3)), int(m.group(2)), int(m.group(1)), today), 0.95)
+    for m in _DAY_MONTH.finditer(text):
+        year = int(m.group(3)) if m.group(3) else None
+        _add(m, _make_date(year, _month_number(m.group(2)), int(m.group(1)), today), 0.9, year)
+    for m in _MONTH_YEAR.finditer(text):
+        year = int(m.group(2)) if m.group(2) else None
+        month = _month_number(m.group(1))
+        # "maj" also starts unrelated words, so a bare month needs a cue word or a year
+        confidence = 0.9 if year else 0.8
+        _add(m, _make_date(year, month, 1, today) if month else None, confidence, year)
+    return sorted(found)
+
+
+def extract_inquiry_fields_locally(message: str, today: Optional[date] = None) -> Extraction:
+    """Deterministic extraction of numeric, date and boolean inquiry fields.
+
+    Confidence reflects how unambiguous the matched pattern is; `covered` is
+    set when every remaining word of the message is filler, i.e. an LLM would
+    have nothing more to extract.
+    """
+    today = today or date.today()
+    text = normalize_numbers(message)
+    result = Extraction()
+    spans: List[Tuple[int, int]] = []
+
+    def _set(name, value, confidence, span):
+        if name not in result.confidence or confidence > result.confidence[name]:
+            result.fields[name] = value
+            result.confidence[name] = confidence
+        spans.append(span)
+
+    for m in _AREA.finditer(text):
+        value = _to_number(m.group(1))
+        if 5 <= value <= 100_000:
+            confidence = 0.85 if m.group(2) == "m" else 0.95
+            _set("office_area_m2", int(round(value)), confidence, m.span())
+
+    # Ends of budgets and headcounts, after which "na miesiac" is a rate
+    rate_ends = []
+    for m in _EMPLOYEES.finditer(text):
+        value = int(m.group(1))
+        if 1 <= value <= 100_000:
+            _set("number_of_employees", value, 0.95, m.span())
+            rate_ends.append(m.end())
+
+    for pattern, confidence in ((_BUDGET_CURRENCY, 0.9), (_BUDGET_KEYWORD, 0.85)):
+        for m in pattern.finditer(text):
+            value = _to_number(m.group(1))
+            if _YEARLY.search(text[m.end():m.end() + 15]):
+                value /= 12
+            if value > 0:
+                _set("monthly_budget_net_PLN", round(value, 2), confidence, m.span())
+                rate_ends.append(m.end())
+
+    dates = _find_dates(text, today)
+    yearless = set()
+    for i, (start, end, value, confidence, has_year) in enumerate(dates):
+        # The cue word closest to the date decides whether it starts or ends the lease
+        before = text[max(0, start - 25):start]
+        start_cue = _START_CUE.search(before)
+        end_cue = _END_CUE.search(before)
+        if start_cue and (not end_cue or start_cue.start() > end_cue.start()):
+            name = "rental_period_start"
+        elif end_cue:
+            name = "rental_period_end"
+        else:
+            name = "rental_period_start" if i == 0 else "rental_period_end"
+            confidence -= 0.1
+        _set(name, value.isoformat(), confidence, (start, end))
+        if not has_year:
+            yearless.add(name)
+
+    # Yearless dates were each rolled past today on their own; a range ends
+    # on the first such date on or after its start
+    start, end = result.fields.get("rental_period_start"), result.fields.get("rental_period_end")
+    if start and end and end < start:
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+        if "rental_period_end" in yearless:
+            while end < start:
+                end = _make_date(end.year + 1, end.month, end.day, today) or end.replace(year=end.year + 1, day=28)
+            result.fields["rental_period_end"] = end.isoformat()
+        else:
+            # Contradictory range; leave it to the LLM
+            for name in ("rental_period_start", "rental_period_end"):
+                result.confidence[name] = min(result.confidence[name], MIN_CONFIDENCE - 0.1)
+
+    months = None
+    for m in _DURATION.finditer(text):
+        # "5000 zl na miesiac", "20 osob na miesiac": a rate, not a lease term
+        if "okres" not in m.group(0) and any(
+            end <= m.start() and _RATE_GAP.fullmatch(text[end:m.start()]) for end in rate_ends
+        ):
+            continue
+        amount = _to_number(m.group(1)) if m.group(1) else 1.0
+        months = amount * 12 if m.group(2).startswith(("rok", "lat")) else amount
+        spans.append(m.span())
+    if months is not None:
+        _set("short_term_rental", months <= 6, 0.9, (0, 0))
+        start = result.fields.get("rental_period_start")
+        if start and "rental_period_end" not in result.fields:
+            end = _add_months(date.fromisoformat(start), months)
+            _set("rental_period_end", end.isoformat(), result.confidence["rental_period_start"], (0, 0))
+
+    for pattern, value in ((_SHORT_TERM, True), (_LONG_TERM, False)):
+        for m in pattern.finditer(text):
+            negation = _NEGATION.search(text[max(0, m.start() - 20):m.start()])
+            if negation:
+                spans.append((max(0, m.start() - 20) + negation.start(), m.start()))
+            _set("short_term_rental", value != bool(negation), 0.9, m.span())
+
+    for m in _ALWAYS_OPEN.finditer(text):
+        _set("access_hours", "24/7", 0.95, m.span())
+    for m in _BUSINESS_HOURS.finditer(text):
+        _set("access_hours", "w godzinach pracy", 0.85, m.span())
+    for m in _HOUR_RANGE.finditer(text):
+        context = text[max(0, m.start() - 20):m.end() + 5]
+        opens, closes = int(m.group(1)), int(m.group(3))
+        if "godz" in context and 0 <= opens < closes <= 24:
+            hours = f"{opens}:{m.group(2) or '00'}-{closes}:{m.group(4) or '00'}"
+            _set("access_hours", hours, 0.9, m.span())
+
+    # Whatever is left after removing the matched spans must be filler
+    chars = list(text)
+    for start, end in spans:
+        chars[start:end] = " " * (end - start)
+    # An unexplained number (e.g. a price per m2) always needs the LLM
+    leftover = [w for w in re.findall(r"\w+", "".join(chars)) if (len(w) > 2 or w.isdigit()) and w not in _FILLER]
+    result.covered = bool(result.fields) and not leftover and all(
+        c >= MIN_CONFIDENCE for c in result.confidence.values()
+    )
+    return result
@@ -0,0 +1,40 @@
+from typing import Any, Dict
+
+
+def _field_type(field: Dict[str, Any]) -> str:
+    if "type" in field:
+        return field["type"] if field["type"] != "array" else "list"
+    types = [option.get("type") for option in field.get("anyOf", []) if option.get("type") != "null"]
+    return "/".join(t for t in types if t) or "string"
+
+
+def compact_form(form_state: Dict[str, Any]) -> str:
+    """Terse form description for prompts: missing fields in full, filled ones as values."""
+    missing = []
+    filled = []
+    for name, field in form_state.items():
+        if field.get("value") is None:
+            line = f"- {name} ({_field_type(field)})"
+            if field.get("format"):
+                line += f" [{field['format']}]"
+            if field.get("description"):
+                line += f": {field['description']}"
+            missing.append(line)
+        else:
+            filled.append(f"{name}={field['value']}")
+
+    sections = []
+    if missing:
+        sections.append("Brakujące pola:\n" + "\n".join(missing))
+    if filled:
+        sections.append("Wypełnione pola: " + "; ".join(filled))
+    return "\n".join(sections)
+
+
+def fallback_question(form_state: Dict[str, Any]) -> str:
+    """Asks for the first missing field by its description, without the LLM."""
+    for field in form_state.values():
+        if field.get("value") is None:
+            description = field.get("description") or field.get("title", "")
+            return description if description.endswith("?") else f"{description}?"
+    return ""
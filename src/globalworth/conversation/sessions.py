@@ -0,0 +1,149 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_TTL_SECONDS = 2 * 60 * 60
+
+
+class SessionStore(ABC):
+    """Conversation state kept on the server, keyed by session id."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS):
+        self.ttl = ttl
+        self._turn_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def create(self, data: Dict[str, Any]) -> str:
+        session_id = uuid.uuid4().hex
+        self.put(session_id, data)
+        return session_id
+
+    def turn_lock(self, session_id: str) -> asyncio.Lock:
+        # Held across a turn's get, LLM call and put, so concurrent messages
+        # on one session apply one after the other. Per process; dropped once
+        # no turn holds it
+        lock = self._turn_locks.get(session_id)
+        if lock is None:
+            lock = self._turn_locks[session_id] = asyncio.Lock()
+        return lock
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, data: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def evict_expired(self) -> int:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_sessions: int = 100_000):
+        super().__init__(ttl)
+        self.max_sessions = max_sessions
+        # Ordered by last write, so expired sessions are always at the front
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return json.loads(entry[1])
+
+    def put(self, session_id, data):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + self.ttl, json.dumps(data))
+            self._sessions.move_to_end(session_id)
+            self._evict_locked()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_expired(self):
+        with self._lock:
+            return self._evict_locked()
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        evicted = 0
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at >= now:
+                break
+            del self._sessions[session_id]
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL_SECONDS, evict_every: int = 100):
+        super().__init__(ttl)
+        self.evict_every = evict_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id, data):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), time.time() + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._db.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, session_id):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def evict_expired(self):
+        with self._lock:
+            return self._db.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def close(self):
+        self._db.close()
+
+
+def create_session_store(url: str = "memory", ttl: float = DEFAULT_TTL_SECONDS) -> SessionStore:
+    # "memory" or "sqlite:///path/to/sessions.db"
+    if url == "memory":
+        return MemorySessionStore(ttl)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):], ttl)
+    raise ValueError(f"Unsupported session store: {url}")
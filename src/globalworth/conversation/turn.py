@@ -0,0 +1,71 @@
+import json
+import logging
+from typing import Annotated, Any, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from globalworth.conversation.prompts import compact_form
+
+logger = logging.getLogger(__name__)
+
+TURN_RESPONSE_FORMAT = """
+Odpowiedz w formacie JSON z dwoma kluczami:
+- "fields": obiekt zawierający tylko pola formularza, na które użytkownik udzielił informacji w tej wiadomości,
+- "next_question": kolejne pytanie do użytkownika o brakujące informacje albo null, jeśli po uwzględnieniu tej odpowiedzi wszystkie pola formularza będą wypełnione.
+Nie zwracaj żadnych dodatkowych informacji ani komunikatów.
+"""
+
+_adapters: Dict[Tuple[type, str], TypeAdapter] = {}
+
+
+def _field_adapter(schema: Type[BaseModel], name: str) -> TypeAdapter:
+    key = (schema, name)
+    if key not in _adapters:
+        field = schema.model_fields[name]
+        # Keep constraints such as gt=0 from the form schema
+        annotation = Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+        _adapters[key] = TypeAdapter(annotation)
+    return _adapters[key]
+
+
+def validate_fields(schema: Type[BaseModel], fields: Dict[str, Any]) -> Dict[str, Any]:
+    # Validates each extracted field against the form schema and returns
+    # JSON-compatible values; unknown keys are dropped
+    validated = {}
+    for name, value in fields.items():
+        if name not in schema.model_fields:
+            continue
+        adapter = _field_adapter(schema, name)
+        validated[name] = adapter.dump_python(adapter.validate_python(value), mode="json")
+    return validated
+
+
+async def fused_turn(
+    llm,
+    call_site: str,
+    system_prompt: str,
+    form_state: Dict[str, Any],
+    user_answer: str,
+    schema: Type[BaseModel],
+) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+    """Extracts the answered fields and asks the next question in one completion.
+
+    Returns None when the response does not validate against `schema`, so the
+    caller can fall back to separate extract and ask calls.
+    """
+    messages = [
+        {"role": "system", "content": system_prompt + TURN_RESPONSE_FORMAT},
+        {"role": "developer", "content": compact_form(form_state)},
+        {"role": "user", "content": user_answer},
+    ]
+    response = await llm.complete_text(call_site, messages, response_format={"type": "json_object"})
+    try:
+        payload = json.loads(response)
+        fields = payload.get("fields")
+        question = payload.get("next_question")
+        if not isinstance(fields, dict) or not (question is None or isinstance(question, str)):
+            raise ValueError("unexpected turn response shape")
+        return validate_fields(schema, fields), question or None
+    except (ValueError, ValidationError, AttributeError) as e:
+        logger.info("Fused turn response rejected for %s: %s", call_site, e)
+        return None
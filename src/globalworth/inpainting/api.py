@@ -1,22 +1,117 @@
 import base64
+import uuid
+from contextlib import contextmanager
 from io import BytesIO
+from urllib.parse import quote
 from PIL import Image
+from fastapi.responses import Response
 
+TARGET_SIZE = (512, 512)
 
-async def read_image(image):
-    content = base64.b64decode(image)
-    pil_image = Image.open(BytesIO(content))
-    pil_image = pil_image.resize((512, 512))
-    return pil_image
+FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
 
 
-def encode_image(img):
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        encoded = base64.b64encode(buffer.getvalue()).decode("utf-8")
+def decode_base64(image: str) -> bytes:
+    # Accepts bare base64 as well as data URLs
+    if image.startswith("data:"):
+        image = image.split(",", 1)[1]
+    return base64.b64decode(image)
+
+
+@contextmanager
+def _decoding():
+    # Undecodable uploads are bad input (400), not server errors
+    try:
+        yield
+    except Image.UnidentifiedImageError as e:
+        raise ValueError("Invalid image: unrecognised format") from e
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Invalid image: {e}") from e
+
+
+def open_image(content: bytes, size=TARGET_SIZE) -> Image.Image:
+    with _decoding():
+        pil_image = Image.open(BytesIO(content))
+        # JPEG decodes straight at a reduced scale (still at least `size`)
+        pil_image.draft("RGB", size)
+        if pil_image.mode != "RGB":
+            pil_image = pil_image.convert("RGB")
+        return pil_image.resize(size, reducing_gap=3.0)
+
+
+def open_native(content: bytes, max_pixels: int = 16 * 2**20) -> Image.Image:
+    # Keeps the aspect ratio; only shrinks past `max_pixels`, and trims the
+    # sides to multiples of 8 as diffusion needs
+    with _decoding():
+        pil_image = Image.open(BytesIO(content))
+        scale = min(1.0, (max_pixels / (pil_image.width * pil_image.height)) ** 0.5)
+        size = (int(pil_image.width * scale), int(pil_image.height * scale))
+        pil_image.draft("RGB", size)
+        if pil_image.mode != "RGB":
+            pil_image = pil_image.convert("RGB")
+        if pil_image.size != size:
+            pil_image = pil_image.resize(size, reducing_gap=3.0)
+        return pil_image.crop((0, 0, size[0] - size[0] % 8, size[1] - size[1] % 8))
+
+
+async def read_image(image, native=False):
+    content = decode_base64(image)
+    return open_native(content) if native else open_image(content)
+
+
+def encode_image(img, format="png", quality=None):
+        encoded = base64.b64encode(image_to_bytes(img, format, quality)).decode("utf-8")
         return encoded
 
 
+def image_to_bytes(img, format="png", quality=None) -> bytes:
+    pil_format, _ = FORMATS[format]
+    options = {}
+    if format in ("jpeg", "webp"):
+        options["quality"] = quality or 90
+    elif format == "png":
+        # Level 1 is several times faster than the default and only slightly larger
+        options["compress_level"] = 1
+    buffer = BytesIO()
+    img.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def image_to_png(img) -> bytes:
+    return image_to_bytes(img, "png")
+
+
+def media_type(format="png") -> str:
+    return FORMATS[format][1]
+
+
+def wants_binary(accept: str) -> bool:
+    return bool(accept) and ("image/" in accept or "multipart/mixed" in accept)
+
+
+def binary_response(images, prompts, format="png") -> Response:
+    # A single image is sent as is; several go out as multipart/mixed, with the
+    # prompt percent-encoded in each part's X-Prompt header
+    if len(images) == 1:
+        return Response(content=images[0], media_type=media_type(format), headers={"X-Prompt": quote(prompts[0])})
+
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    for data, prompt in zip(images, prompts):
+        body.write(f"--{boundary}\r\n".encode())
+        body.write(f"Content-Type: {media_type(format)}\r\n".encode())
+        body.write(f"Content-Length: {len(data)}\r\n".encode())
+        body.write(f"X-Prompt: {quote(prompt)}\r\n\r\n".encode())
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return Response(content=body.getvalue(), media_type=f"multipart/mixed; boundary={boundary}")
+
+
 def base64_to_image(base64_str: str) -> Image.Image:
     image_data = base64.b64decode(base64_str)
-    return Image.open(BytesIO(image_data))
\ No newline at end of file
+    return Image.open(BytesIO(image_data))
@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, List, Optional
+
+from globalworth.metrics import REGISTRY, record_stage
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+INTERACTIVE = 0
+BULK = 1
+
+BATCH_SIZE = REGISTRY.histogram(
+    "inpaint_batch_size", "Images per pipeline call.", buckets=(1, 2, 3, 4, 6, 8, 12, 16)
+)
+
+
+class Reservation:
+    """Queue slots held for work that enqueues later; see MicroBatcher.reserve."""
+
+    def __init__(self, batcher: "MicroBatcher", count: int):
+        self._batcher = batcher
+        self.count = count
+
+    def release(self):
+        self._batcher._reserved -= self.count
+        self.count = 0
+
+
+class MicroBatcher:
+    """Gathers concurrent inpainting requests into batched pipeline calls.
+
+    Requests arriving within `max_wait` seconds of the first one in a batch
+    are run together, up to `max_batch_size`, highest priority first. Images
+    of different sizes or generation options go into separate pipeline calls.
+    `run_batch(images, prompts, seeds, **options)` runs on `executor`, with
+    at most `concurrency` batches in
+    flight; by default a single thread, so the pipeline is never entered
+    concurrently. With `max_queue` set, enqueueing past it raises
+    asyncio.QueueFull. With `ready` (an asyncio.Event) set, nothing reaches
+    the executor until the event is set; requests queue up meanwhile.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List, List[str]], List],
+        max_batch_size: int = 4,
+        max_wait: float = 0.02,
+        executor: Optional[Executor] = None,
+        concurrency: int = 1,
+        max_queue: int = 0,
+        ready: Optional[asyncio.Event] = None,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.ready = ready
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self._reserved = 0
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="inpainting")
+
+    def start(self):
+        if not self._workers:
+            self._queue = asyncio.PriorityQueue(maxsize=self.max_queue)
+            loop = asyncio.get_running_loop()
+            self._workers = [loop.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def has_capacity(self, count: int = 1) -> bool:
+        return not self.max_queue or self.queue_depth + self._reserved + count <= self.max_queue
+
+    def reserve(self, count: int) -> Optional[Reservation]:
+        # For work accepted now but enqueued later (e.g. after an LLM call):
+        # the slots count against the queue until enqueue_many or release()
+        if not self.has_capacity(count):
+            return None
+        self._reserved += count
+        return Reservation(self, count)
+
+    def enqueue(
+        self, image, prompt: str, priority: int = BULK, seed: Optional[int] = None, preview: Optional[int] = None, **options
+    ) -> asyncio.Future:
+        # `preview` is a per-image token, handed to run_batch as preview_tokens
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        item = (priority, next(self._sequence), image, prompt, seed, options, preview, time.perf_counter(), future)
+        self._queue.put_nowait(item)
+        return future
+
+    def enqueue_many(
+        self, images, prompts, priority: int = BULK, seeds=None, previews=None,
+        reservation: Optional[Reservation] = None, **options
+    ) -> List[asyncio.Future]:
+        if reservation is not None:
+            reservation.release()
+        # All or nothing, so a rejected request leaves nothing behind in the queue
+        if not self.has_capacity(len(images)):
+            raise asyncio.QueueFull()
+        seeds = seeds or [None] * len(images)
+        previews = previews or [None] * len(images)
+        return [
+            self.enqueue(image, prompt, priority, seed, preview, **options)
+            for image, prompt, seed, preview in zip(images, prompts, seeds, previews)
+        ]
+
+    async def submit(self, image, prompt: str, priority: int = BULK, seed: Optional[int] = None, **options):
+        return await self.enqueue(image, prompt, priority, seed, **options)
+
+    async def submit_many(self, images, prompts, priority: int = BULK, seeds=None, **options):
+        return await asyncio.gather(*self.enqueue_many(images, prompts, priority, seeds, **options))
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        if self.ready is not None:
+            await self.ready.wait()
+        while True:
+            batch = [item for item in await self._collect() if not item[-1].cancelled()]
+            groups = {}
+            for item in batch:
+                key = (item[2].size, tuple(sorted(item[5].items())))
+                groups.setdefault(key, []).append(item)
+
+            for items in groups.values():
+                images = [item[2] for item in items]
+                prompts = [item[3] for item in items]
+                seeds = [item[4] for item in items]
+                options = dict(items[0][5])
+                previews = [item[6] for item in items]
+                if any(token is not None for token in previews):
+                    options["preview_tokens"] = previews
+                run = partial(self.run_batch, images, prompts, seeds, **options)
+                started = time.perf_counter()
+                for item in items:
+                    record_stage("queue_wait", started - item[7])
+                BATCH_SIZE.observe(len(items))
+                try:
+                    results = await loop.run_in_executor(self._executor, run)
+                    record_stage("diffusion", time.perf_counter() - started)
+                except Exception as e:
+                    logger.exception("Inpainting batch of %d failed", len(items))
+                    for item in items:
+                        if not item[-1].done():
+                            item[-1].set_exception(e)
+                    continue
+                for item, result in zip(items, results):
+                    if not item[-1].done():
+                        item[-1].set_result(result)
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from globalworth.inpainting.api import FORMATS
+from globalworth.inpainting.config import MASK_BLUR_FACTOR, MASK_CENTRAL_RATIO, MODEL_ID, NUM_INFERENCE_STEPS
+
+logger = logging.getLogger(__name__)
+
+
+def result_key(
+    image,
+    prompt: str,
+    seed: int,
+    steps: int = NUM_INFERENCE_STEPS,
+    central_ratio: float = MASK_CENTRAL_RATIO,
+    blur_factor: int = MASK_BLUR_FACTOR,
+    model_id: str = MODEL_ID,
+    **extra,
+) -> str:
+    # Everything that changes the generated pixels goes into the key
+    image_hash = hashlib.sha256(image.tobytes()).hexdigest()
+    params = {
+        "image": [image_hash, image.mode, list(image.size)],
+        "prompt": prompt,
+        "seed": seed,
+        "steps": steps,
+        "central_ratio": central_ratio,
+        "blur_factor": blur_factor,
+        "model_id": model_id,
+        **extra,
+    }
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Two-tier store of encoded results keyed by `result_key`.
+
+    Memory holds the most recently used results up to `memory_bytes`; the
+    disk tier keeps up to `disk_bytes` in `directory`, one file per result
+    named after its format, evicting the least recently used files first.
+    Disk reads and writes run in a worker thread.
+    """
+
+    def __init__(self, directory: Optional[str] = None, memory_bytes: int = 256 * 2**20, disk_bytes: int = 4 * 2**30):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        # File name -> size, least recently used first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._scan_disk()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultCache"]:
+        if os.getenv("INPAINT_CACHE", "1") != "1":
+            return None
+        return cls(
+            directory=os.getenv("INPAINT_CACHE_DIR", ".cache/inpainting") or None,
+            memory_bytes=int(os.getenv("INPAINT_CACHE_MEMORY_MB", "256")) * 2**20,
+            disk_bytes=int(os.getenv("INPAINT_CACHE_DISK_MB", "4096")) * 2**20,
+        )
+
+    def _scan_disk(self):
+        # Oldest first, so eviction order survives restarts
+        files = []
+        for name in os.listdir(self.directory):
+            if os.path.splitext(name)[1][1:] in FORMATS:
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._disk[name] = size
+            self._disk_size += size
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    async def get(self, key: str, format: str = "png") -> Optional[bytes]:
+        name = f"{key}.{format}"
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+            on_disk = name in self._disk
+        if on_disk:
+            data = await asyncio.to_thread(self._read, name)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self._remember(key, data)
+            self.hits += 1
+            return data
+
+    async def put(self, key: str, data: bytes, format: str = "png"):
+        with self._lock:
+            self._remember(key, data)
+        if self.directory and len(data) <= self.disk_bytes:
+            await asyncio.to_thread(self._write, f"{key}.{format}", data)
+
+    def _read(self, name: str) -> Optional[bytes]:
+        with self._disk_lock:
+            try:
+                with open(self._path(name), "rb") as f:
+                    data = f.read()
+                os.utime(self._path(name))
+            except OSError:
+                with self._lock:
+                    if name in self._disk:
+                        self._disk_size -= self._disk.pop(name)
+                return None
+            with self._lock:
+                if name in self._disk:
+                    self._disk.move_to_end(name)
+            return data
+
+    def _write(self, name: str, data: bytes):
+        with self._disk_lock:
+            with self._lock:
+                if name in self._disk:
+                    return
+            tmp = self._path(name) + ".tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, self._path(name))
+            except OSError as e:
+                logger.warning("Could not persist inpainting result %s: %s", name, e)
+                return
+            evicted = []
+            with self._lock:
+                self._disk[name] = len(data)
+                self._disk_size += len(data)
+                while self._disk_size > self.disk_bytes:
+                    old_name, size = self._disk.popitem(last=False)
+                    self._disk_size -= size
+                    evicted.append(old_name)
+            for old_name in evicted:
+                try:
+                    os.remove(self._path(old_name))
+                except OSError:
+                    pass
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_size,
+            }
@@ -0,0 +1,72 @@
+import os
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+# Generation defaults; kept free of torch imports so the API process can
+# build cache keys without loading the diffusion stack
+MODEL_ID = "runwayml/stable-diffusion-inpainting"
+DEFAULT_SEED = 92
+NUM_INFERENCE_STEPS = 50
+MASK_CENTRAL_RATIO = 0.80
+MASK_BLUR_FACTOR = 33
+
+# Steps per quality tier; override with e.g. INPAINT_QUALITY_TIERS="preview=4,standard=6,high=8"
+# when running a few-step scheduler
+QUALITY_TIERS = {"preview": 10, "standard": 25, "high": NUM_INFERENCE_STEPS}
+DEFAULT_TIER = "high"
+
+
+@dataclass(frozen=True)
+class ExecutionProfile:
+    device: str = "cuda"
+    dtype: str = "fp16"  # fp16 | bf16 | fp32
+    attention: str = "xformers"  # xformers | sdpa
+    cpu_offload: bool = True
+    channels_last: bool = False
+    threads: int = 0  # intra-op threads, 0 keeps torch's default
+    compile: bool = False
+    scheduler: str = "default"  # default | dpm | euler_a | lcm
+    lcm_lora: str = "latent-consistency/lcm-lora-sdv1-5"
+    guidance_scale: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        # The parts that change generated pixels
+        return f"{self.dtype}/{self.scheduler}"
+
+
+PROFILES: Dict[str, ExecutionProfile] = {
+    "gpu": ExecutionProfile(),
+    "cpu": ExecutionProfile(device="cpu", dtype="fp32", attention="sdpa", cpu_offload=False, channels_last=True),
+}
+
+
+def profile_from_env() -> ExecutionProfile:
+    profile = PROFILES[os.getenv("INPAINT_PROFILE", "gpu")]
+    overrides = {
+        "dtype": os.getenv("INPAINT_DTYPE"),
+        "attention": os.getenv("INPAINT_ATTENTION"),
+        "scheduler": os.getenv("INPAINT_SCHEDULER"),
+        "lcm_lora": os.getenv("INPAINT_LCM_LORA"),
+    }
+    overrides = {name: value for name, value in overrides.items() if value}
+    for name in ("cpu_offload", "channels_last", "compile"):
+        value = os.getenv(f"INPAINT_{name.upper()}")
+        if value:
+            overrides[name] = value == "1"
+    if os.getenv("INPAINT_THREADS"):
+        overrides["threads"] = int(os.getenv("INPAINT_THREADS"))
+    if os.getenv("INPAINT_GUIDANCE_SCALE"):
+        overrides["guidance_scale"] = float(os.getenv("INPAINT_GUIDANCE_SCALE"))
+    elif overrides.get("scheduler", profile.scheduler) == "lcm":
+        # LCM-distilled weights want little or no classifier-free guidance
+        overrides["guidance_scale"] = 1.0
+    return replace(profile, **overrides)
+
+
+def quality_tiers_from_env() -> Dict[str, int]:
+    tiers = dict(QUALITY_TIERS)
+    for entry in filter(None, os.getenv("INPAINT_QUALITY_TIERS", "").split(",")):
+        name, steps = entry.split("=")
+        tiers[name.strip()] = int(steps)
+    return tiers
@@ -1,5 +1,13 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFilter
+
+from globalworth.inpainting.config import MASK_BLUR_FACTOR, MASK_CENTRAL_RATIO
 
 
 def generate_center_white_image(width=256, height=256, central_ratio=0.75):
@@ -13,3 +21,75 @@ def generate_center_white_image(width=256, height=256, central_ratio=0.75):
     image[margin_y : height - margin_y, margin_x : width - margin_x] = 255
 
     return Image.fromarray(image)
+
+
+def blur_mask(mask, blur_factor=MASK_BLUR_FACTOR):
+    # Same Gaussian blur as diffusers' VaeImageProcessor.blur
+    return mask.filter(ImageFilter.GaussianBlur(blur_factor)) if blur_factor else mask
+
+
+@lru_cache(maxsize=32)
+def center_mask(width, height, central_ratio=MASK_CENTRAL_RATIO, blur_factor=MASK_BLUR_FACTOR):
+    # Shared between calls; callers must not modify the returned image
+    return blur_mask(generate_center_white_image(width, height, central_ratio), blur_factor)
+
+
+def polygon_mask(width, height, include=(), exclude=(), central_ratio=MASK_CENTRAL_RATIO, blur_factor=MASK_BLUR_FACTOR):
+    # Polygons are lists of [x, y] points relative to the image size (0-1);
+    # without `include` the central rectangle is inpainted
+    if include:
+        mask = Image.new("L", (width, height), 0)
+        draw = ImageDraw.Draw(mask)
+        for polygon in include:
+            draw.polygon([(x * width, y * height) for x, y in polygon], fill=255)
+    else:
+        mask = generate_center_white_image(width, height, central_ratio)
+        draw = ImageDraw.Draw(mask)
+    for polygon in exclude:
+        draw.polygon([(x * width, y * height) for x, y in polygon], fill=0)
+    return blur_mask(mask, blur_factor)
+
+
+def mask_spec_key(spec) -> str:
+    # Canonical JSON of a mask spec; hashable, so it can travel with batch options
+    return json.dumps(spec, sort_keys=True, separators=(",", ":"))
+
+
+class MaskCache:
+    """Bounded LRU of rendered masks keyed by spec content hash and size."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, spec_key, width, height):
+        key = (hashlib.sha256(spec_key.encode("utf-8")).hexdigest(), width, height)
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+        spec = json.loads(spec_key)
+        mask = polygon_mask(
+            width,
+            height,
+            include=spec.get("include") or (),
+            exclude=spec.get("exclude") or (),
+            central_ratio=spec.get("central_ratio") or MASK_CENTRAL_RATIO,
+            blur_factor=spec.get("blur_factor", MASK_BLUR_FACTOR),
+        )
+        with self._lock:
+            self._masks[key] = mask
+            while len(self._masks) > self.max_entries:
+                self._masks.popitem(last=False)
+        return mask
+
+
+region_masks = MaskCache()
+
+
+def build_mask(width, height, spec_key=None):
+    if spec_key is None:
+        return center_mask(width, height)
+    return region_masks.get(spec_key, width, height)
@@ -0,0 +1,79 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, Optional
+
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == DONE:
+            data["results"] = self.result
+        if self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """Tracks background inpainting jobs; finished jobs are kept for `ttl` seconds."""
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._tasks = set()
+
+    def submit(self, kind: str, work: Awaitable) -> Job:
+        self._evict()
+        job = Job(id=uuid.uuid4().hex, kind=kind)
+        self._jobs[job.id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, work: Awaitable):
+        try:
+            job.result = await work
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
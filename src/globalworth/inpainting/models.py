@@ -1,6 +1,6 @@
-from typing import Union, List
+from typing import Annotated, Union, List, Optional, Literal
 from typing import List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Section(BaseModel):
@@ -8,14 +8,54 @@ class Section(BaseModel):
     value: Union[str, List[str]]
 
 
+# An [x, y] point relative to the image size (0-1)
+Point = Annotated[List[Annotated[float, Field(ge=0, le=1)]], Field(min_length=2, max_length=2)]
+Polygon = Annotated[List[Point], Field(min_length=3)]
+
+
+class MaskRegion(BaseModel):
+    include: List[Polygon] = []
+    exclude: List[Polygon] = []
+    central_ratio: Optional[float] = Field(default=None, gt=0, lt=1)
+    # Gaussian blur radius in pixels
+    blur_factor: int = Field(default=33, ge=0, le=256)
+
+
 class OfficeDesignRequest(BaseModel):
     interior_style: Section
     layout_preferences: Section
     equipment_and_features: Section
     additional_notes_on_design: Section
-    images: Section
+    # Either base64 images or ids from the asset store
+    images: Optional[Section] = None
+    image_ids: Optional[List[str]] = None
+    seed: Optional[int] = None
+    mask: Optional[MaskRegion] = None
+    output_format: Optional[Literal["png", "jpeg", "webp"]] = None
+    quality: Optional[int] = Field(default=None, ge=1, le=100)
+    # Sampling effort: a named tier, or an explicit step count
+    tier: Optional[Literal["preview", "standard", "high"]] = None
+    steps: Optional[int] = Field(default=None, ge=1, le=150)
+    # Keep the upload's size and aspect ratio, generating in tiles
+    native_resolution: bool = False
+
+
+# Fields that steer generation rather than describe the design
+GENERATION_OPTIONS = {
+    "image_ids", "seed", "mask", "output_format", "quality", "tier", "steps", "native_resolution"
+}
 
 
 class InpaintModification(BaseModel):
-    image: str
+    image: Optional[str] = None
+    image_id: Optional[str] = None
     prompt: str
+    seed: Optional[int] = None
+    mask: Optional[MaskRegion] = None
+    output_format: Optional[Literal["png", "jpeg", "webp"]] = None
+    quality: Optional[int] = Field(default=None, ge=1, le=100)
+    # Sampling effort: a named tier, or an explicit step count
+    tier: Optional[Literal["preview", "standard", "high"]] = None
+    steps: Optional[int] = Field(default=None, ge=1, le=150)
+    # Keep the upload's size and aspect ratio, generating in tiles
+    native_resolution: bool = False
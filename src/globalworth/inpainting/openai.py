@@ -1,5 +1,7 @@
 import json
 
+from globalworth.inpainting.models import GENERATION_OPTIONS
+
 SYSTEM_PROMPT = """
 Jesteś pomocnym asystentem użytkownika. Na podstawie podanego słownika wyślij 
 wygeneruj 3 opisy zagospodoarowania pustej przestrzeni biurowej. Zadbaj o to 
@@ -11,17 +13,17 @@ się z klucza 'description' a w nim powinna się znajdować lista 3 opisów. Pos
 """
 
 
-def get_inpainting_prompts(client, data):
+async def get_inpainting_prompts(llm, data):
     data = data.model_copy()
     del data.images
-    openai_request = str(data.model_dump())
-    response = _get_room_descriptions(client, openai_request)
+    openai_request = str(data.model_dump(exclude=GENERATION_OPTIONS))
+    response = await _get_room_descriptions(llm, openai_request)
     response = json.loads(response)
     prompts = response["description"]
     return prompts
 
 
-def _get_room_descriptions(client, prompt):
+async def _get_room_descriptions(llm, prompt):
     messages = [
         {
             "role": "system", 
@@ -32,10 +34,9 @@ def _get_room_descriptions(client, prompt):
             "content": prompt
         }
     ]
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
+    return await llm.complete_text(
+        "inpainting_prompts",
+        messages,
         temperature=0.2,
         response_format={"type": "json_object"}
     )
-    return response.choices[0].message.content
@@ -1,32 +1,358 @@
-import numpy as np
+import glob
+import hashlib
+import importlib
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict
+from typing import Optional
 
-import torch
-from diffusers import AutoPipelineForInpainting
+from PIL import Image
 
-from globalworth.inpainting.image_utils import generate_center_white_image
+from globalworth.inpainting.config import DEFAULT_SEED, MODEL_ID, NUM_INFERENCE_STEPS, ExecutionProfile, profile_from_env
+from globalworth.inpainting.image_utils import build_mask
 
+logger = logging.getLogger(__name__)
 
-def get_pipeline():
+# torch and diffusers are imported where they are used, so importing this
+# module (and answering health checks) does not wait for the diffusion stack
+
+LOADING = "loading"
+WARMING_UP = "warming_up"
+READY = "ready"
+FAILED = "failed"
+
+
+def _has_variant(path: str, variant: str) -> bool:
+    return bool(glob.glob(os.path.join(path, "**", f"*.{variant}.safetensors"), recursive=True))
+
+
+def snapshot_fingerprint(path: str) -> str:
+    # File names, sizes and mtimes rather than contents: the weights are
+    # gigabytes, and replacing or re-downloading a file changes its stat
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            stat = os.stat(full)
+            digest.update(f"{os.path.relpath(full, path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+SCHEDULERS = {
+    "dpm": "DPMSolverMultistepScheduler",
+    "euler_a": "EulerAncestralDiscreteScheduler",
+    "lcm": "LCMScheduler",
+}
+
+
+def get_pipeline(model_id=MODEL_ID, model_path=None, revision=None, variant="fp16", profile=None):
+    import torch
+    import diffusers
+    from diffusers import AutoPipelineForInpainting
+
+    profile = profile or ExecutionProfile()
+    if profile.threads:
+        torch.set_num_threads(profile.threads)
+    dtype = {"fp16": torch.float16, "bf16": torch.bfloat16, "fp32": torch.float32}[profile.dtype]
+
+    # A local snapshot loads without touching the network; safetensors files
+    # are memory-mapped instead of read and unpickled
+    source = model_path or model_id
+    if model_path and variant and not _has_variant(model_path, variant):
+        variant = None
     pipeline = AutoPipelineForInpainting.from_pretrained(
-        "runwayml/stable-diffusion-inpainting",
-        torch_dtype=torch.float16,
-        variant="fp16",
+        source,
+        torch_dtype=dtype,
+        variant=variant,
+        revision=None if model_path else revision,
+        local_files_only=bool(model_path),
+        use_safetensors=True,
+        low_cpu_mem_usage=True,
     )
 
-    pipeline.enable_model_cpu_offload()
-    pipeline.enable_xformers_memory_efficient_attention()
+    if profile.scheduler != "default":
+        scheduler = getattr(diffusers, SCHEDULERS[profile.scheduler])
+        pipeline.scheduler = scheduler.from_config(pipeline.scheduler.config)
+    if profile.scheduler == "lcm":
+        # Few-step sampling needs the LCM-distilled adapter merged into the UNet
+        pipeline.load_lora_weights(profile.lcm_lora)
+        pipeline.fuse_lora()
+
+    if profile.attention == "xformers":
+        pipeline.enable_xformers_memory_efficient_attention()
+    else:
+        from diffusers.models.attention_processor import AttnProcessor2_0
+
+        pipeline.unet.set_attn_processor(AttnProcessor2_0())
+        pipeline.vae.set_attn_processor(AttnProcessor2_0())
+
+    if profile.cpu_offload:
+        pipeline.enable_model_cpu_offload()
+    else:
+        pipeline.to(profile.device)
+    if profile.channels_last:
+        pipeline.unet.to(memory_format=torch.channels_last)
+        pipeline.vae.to(memory_format=torch.channels_last)
+    if profile.compile:
+        pipeline.unet = torch.compile(pipeline.unet)
     return pipeline
 
 
-def generate_inpainted_image(pipeline, image, prompt):
-    mask_image = generate_center_white_image(
-        image.size[0], image.size[1], central_ratio=0.80
+def download_snapshot(directory, model_id=MODEL_ID, revision=None, variant="fp16"):
+    from huggingface_hub import snapshot_download
+
+    weights = f"*.{variant}.safetensors" if variant else "*.safetensors"
+    return snapshot_download(
+        model_id,
+        revision=revision,
+        local_dir=directory,
+        allow_patterns=["*.json", "*.txt", weights],
     )
-    blurred_mask = pipeline.mask_processor.blur(mask_image, blur_factor=33)
-    # generator = torch.Generator("cuda").manual_seed(92)
-    image = pipeline(
-        prompt=prompt,
-        image=image,
-        mask_image=blurred_mask,  # generator=generator
-    ).images[0]
-    return image
+
+
+def load_factory(spec: str):
+    # "package.module:callable", e.g. a stand-in pipeline for benchmarks
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def generate_inpainted_image(pipeline, image, prompt, seed=DEFAULT_SEED, steps=NUM_INFERENCE_STEPS, **options):
+    return generate_inpainted_images(pipeline, [image], [prompt], [seed], steps=steps, **options)[0]
+
+
+def generate_inpainted_images(
+    pipeline, images, prompts, seeds=None, steps=NUM_INFERENCE_STEPS, mask=None, guidance_scale=None,
+    on_preview=None, preview_every=0, masks=None,
+):
+    # One pipeline call for the whole batch; images must share a size.
+    # `mask` is a mask spec key (see image_utils.mask_spec_key), None for the
+    # default; `masks` gives ready-made mask images instead
+    masks = masks or [build_mask(image.size[0], image.size[1], mask) for image in images]
+    # A CPU generator per image keeps results reproducible on any device
+    seeds = seeds or [None] * len(images)
+    generators = _generators(pipeline, [DEFAULT_SEED if seed is None else seed for seed in seeds])
+    options = {} if guidance_scale is None else {"guidance_scale": guidance_scale}
+    if on_preview is not None and preview_every > 0:
+        options.update(
+            callback_on_step_end=_preview_callback(on_preview, preview_every, steps),
+            callback_on_step_end_tensor_inputs=["latents"],
+        )
+    return pipeline(
+        prompt=list(prompts),
+        image=list(images),
+        mask_image=masks,
+        generator=generators,
+        num_inference_steps=steps,
+        **options,
+    ).images
+
+
+def _generators(pipeline, seeds):
+    # Stand-in pipelines bring their own generators, so they run without torch
+    make_generator = getattr(pipeline, "make_generator", None)
+    if make_generator is not None:
+        return [make_generator(seed) for seed in seeds]
+    import torch
+
+    return [torch.Generator("cpu").manual_seed(seed) for seed in seeds]
+
+
+def _preview_callback(on_preview, every, steps):
+    from globalworth.inpainting.previews import latents_to_previews
+
+    # Every `every` steps, on_preview(index, step, steps, image) per batch element;
+    # the last step is left to the full decode
+    def callback(pipeline, step, timestep, tensors):
+        done = step + 1
+        if done % every == 0 and done < steps:
+            for index, image in enumerate(latents_to_previews(tensors["latents"])):
+                on_preview(index, done, steps, image)
+        return tensors
+
+    return callback
+
+
+class PipelineManager:
+    """Owns the pipeline of one process: loading, warmup and readiness.
+
+    `start` loads in a background thread so the server can answer readiness
+    probes meanwhile; `load` does the same synchronously. Batches submitted
+    before the pipeline is ready wait for it.
+    """
+
+    def __init__(
+        self,
+        model_id: str = MODEL_ID,
+        model_path: Optional[str] = None,
+        revision: Optional[str] = None,
+        variant: Optional[str] = "fp16",
+        warmup_steps: int = 1,
+        profile: Optional[ExecutionProfile] = None,
+        tile_memory_mb: int = 2048,
+        factory=None,
+    ):
+        self.model_id = model_id
+        self.model_path = model_path
+        self.revision = revision
+        self.variant = variant
+        self.warmup_steps = warmup_steps
+        self.profile = profile or ExecutionProfile()
+        # Peak memory allowed for tiled (native resolution) generation
+        self.tile_memory_mb = tile_memory_mb
+        # Builds the pipeline instead of get_pipeline when set
+        self.factory = factory
+        # Where step previews go (see previews.PreviewHub); None disables them
+        self.preview_queue = None
+        self.state = LOADING
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._pipeline = None
+        self._snapshot: Optional[str] = None
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "PipelineManager":
+        factory = os.getenv("INPAINT_PIPELINE_FACTORY")
+        return cls(
+            model_id=os.getenv("INPAINT_MODEL_ID", MODEL_ID),
+            model_path=os.getenv("INPAINT_MODEL_PATH") or None,
+            revision=os.getenv("INPAINT_MODEL_REVISION") or None,
+            variant=os.getenv("INPAINT_MODEL_VARIANT", "fp16") or None,
+            warmup_steps=int(os.getenv("INPAINT_WARMUP_STEPS", "1")),
+            profile=profile_from_env(),
+            tile_memory_mb=int(os.getenv("INPAINT_TILE_MEMORY_MB", "2048")),
+            factory=load_factory(factory) if factory else None,
+        )
+
+    @property
+    def model(self) -> str:
+        # Identifies the weights and sampling setup in result cache keys
+        model = f"{self.model_id}@{self.revision}" if self.revision else self.model_id
+        if self.model_path:
+            # A local snapshot is what actually loads, whatever model_id says
+            if self._snapshot is None:
+                self._snapshot = snapshot_fingerprint(self.model_path)
+            model = f"{model}#{self._snapshot}"
+        return f"{model}|{self.profile.key}"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load_quietly, name="inpainting-pipeline-loader", daemon=True)
+            self._thread.start()
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception:
+            pass
+
+    def load(self, warmup: bool = True):
+        try:
+            started = time.perf_counter()
+            if self.factory is not None:
+                pipeline = self.factory()
+            else:
+                if self.model_path:
+                    # Taken as the snapshot is loaded, so keys match the weights in memory
+                    self._snapshot = snapshot_fingerprint(self.model_path)
+                pipeline = get_pipeline(self.model_id, self.model_path, self.revision, self.variant, self.profile)
+            self.load_seconds = time.perf_counter() - started
+            logger.info("Loaded %s in %.1fs", self.model_path or self.model, self.load_seconds)
+            if warmup:
+                self._warm_up(pipeline)
+        except Exception as e:
+            self._fail(e)
+            raise
+
+        self._pipeline = pipeline
+        self.state = READY
+        self._done.set()
+        return pipeline
+
+    def warm_up(self):
+        # For a pipeline loaded with warmup=False, e.g. in a process forked after loading
+        try:
+            self._warm_up(self.wait())
+        except Exception as e:
+            self._fail(e)
+            raise
+        self.state = READY
+
+    def _warm_up(self, pipeline):
+        if self.warmup_steps <= 0:
+            return
+        # First calls pay for kernel selection and allocator growth
+        self.state = WARMING_UP
+        started = time.perf_counter()
+        blank = Image.new("RGB", (512, 512), (255, 255, 255))
+        generate_inpainted_images(
+            pipeline, [blank], [""], steps=self.warmup_steps, guidance_scale=self.profile.guidance_scale
+        )
+        self.warmup_seconds = time.perf_counter() - started
+        logger.info("Warmed up in %.1fs", self.warmup_seconds)
+
+    def _fail(self, error: Exception):
+        logger.exception("Could not load the inpainting pipeline")
+        self.state = FAILED
+        self.error = str(error)
+        self._pipeline = None
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Inpainting pipeline is still loading.")
+        if self._pipeline is None:
+            raise RuntimeError(f"Inpainting pipeline failed to load: {self.error}")
+        return self._pipeline
+
+    def run_batch(self, images, prompts, seeds=None, preview_tokens=None, tiled=False, **options):
+        options.setdefault("guidance_scale", self.profile.guidance_scale)
+        if tiled:
+            return self._run_tiled(images, prompts, seeds, **options)
+        if preview_tokens and self.preview_queue is not None:
+            from globalworth.inpainting.previews import preview_publisher
+
+            options["on_preview"] = preview_publisher(self.preview_queue, preview_tokens)
+        return generate_inpainted_images(self.wait(), images, prompts, seeds, **options)
+
+    def _run_tiled(self, images, prompts, seeds=None, mask=None, **options):
+        from globalworth.inpainting.tiling import generate_tiled, tile_batch_size
+
+        pipeline = self.wait()
+
+        def run(tiles, tile_prompts, tile_seeds, tile_masks):
+            return generate_inpainted_images(pipeline, tiles, tile_prompts, tile_seeds, masks=tile_masks, **options)
+
+        batch_size = tile_batch_size(self.tile_memory_mb, self.profile.dtype)
+        seeds = seeds or [None] * len(images)
+        return [
+            generate_tiled(run, image, prompt, seed, mask, batch_size)
+            for image, prompt, seed in zip(images, prompts, seeds)
+        ]
+
+    def status(self):
+        return {
+            "state": self.state,
+            "model": self.model_path or self.model,
+            "profile": asdict(self.profile),
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m globalworth.inpainting.pipeline <directory> [revision]
+    # fetches a pinned snapshot for INPAINT_MODEL_PATH
+    print(download_snapshot(sys.argv[1], revision=sys.argv[2] if len(sys.argv) > 2 else None))
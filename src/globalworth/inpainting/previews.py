@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import threading
+from io import BytesIO
+from queue import SimpleQueue
+from typing import Dict, Optional
+
+# Linear map from Stable Diffusion 1.x latent channels to RGB. Far cheaper
+# than a VAE decode and good enough to show where a generation is heading
+LATENT_RGB_FACTORS = [
+    [0.3512, 0.2297, 0.3227],
+    [0.3250, 0.4974, 0.2350],
+    [-0.2829, 0.1762, 0.2721],
+    [-0.2120, -0.2616, -0.7177],
+]
+PREVIEW_SIZE = 256
+PREVIEW_QUALITY = 70
+
+
+def latents_to_previews(latents, size: int = PREVIEW_SIZE):
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=torch.float32, device=latents.device)
+    rgb = latents.float().permute(0, 2, 3, 1) @ factors
+    rgb = ((rgb + 1) * 127.5).clamp(0, 255).to(torch.uint8).cpu().numpy()
+    images = []
+    for array in rgb:
+        image = Image.fromarray(np.ascontiguousarray(array))
+        scale = size / max(image.size)
+        images.append(image.resize((round(image.width * scale), round(image.height * scale)), Image.BILINEAR))
+    return images
+
+
+def encode_preview(image) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=PREVIEW_QUALITY)
+    return buffer.getvalue()
+
+
+def preview_publisher(queue, tokens):
+    """`on_preview` for generate_inpainted_images: batch index -> subscriber token.
+
+    Previews are JPEG-encoded where they are made, so only small byte
+    strings cross the queue (and process boundaries, for worker pools).
+    """
+
+    def on_preview(index, step, total, image):
+        token = tokens[index]
+        if token is not None:
+            queue.put((token, step, total, encode_preview(image)))
+
+    return on_preview
+
+
+class PreviewHub:
+    """Routes step previews from pipeline calls to per-request asyncio queues.
+
+    `queue` is any queue the pipeline side can put to: a thread-safe queue
+    for in-process inference, a multiprocessing queue handed to worker
+    processes otherwise. A reader thread forwards items to the event loop.
+    """
+
+    def __init__(self, queue=None):
+        self.queue = queue if queue is not None else SimpleQueue()
+        self._tokens = itertools.count(1)
+        self._subscribers: Dict[int, asyncio.Queue] = {}
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        if self._reader is None:
+            self._loop = asyncio.get_running_loop()
+            self._reader = threading.Thread(target=self._read, name="inpainting-previews", daemon=True)
+            self._reader.start()
+
+    def stop(self):
+        if self._reader is not None:
+            self.queue.put(None)
+            self._reader.join(timeout=5)
+            self._reader = None
+
+    def _read(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self._loop.call_soon_threadsafe(self._deliver, *item)
+
+    def _deliver(self, token, step, total, data):
+        subscriber = self._subscribers.get(token)
+        if subscriber is not None:
+            subscriber.put_nowait((step, total, data))
+
+    @property
+    def streams(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self):
+        token = next(self._tokens)
+        self._subscribers[token] = asyncio.Queue()
+        return token, self._subscribers[token]
+
+    def unsubscribe(self, token: int):
+        self._subscribers.pop(token, None)
@@ -0,0 +1,123 @@
+import asyncio
+import gc
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+
+# Set in each worker process by the pool initializer, or inherited from the
+# parent when workers are forked after loading
+_manager = None
+# Lets warm_up reach every worker exactly once
+_barrier = None
+
+
+def _set_threads(threads: int):
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+
+
+def _cuda_initialized() -> bool:
+    # Without importing torch: if nothing imported it, nothing started CUDA
+    torch = sys.modules.get("torch")
+    return torch is not None and torch.cuda.is_initialized()
+
+
+def _load_pipeline(barrier, threads: int = 0, preview_queue=None):
+    global _manager, _barrier
+    from globalworth.inpainting.pipeline import PipelineManager
+
+    _barrier = barrier
+    _set_threads(threads)
+    _manager = PipelineManager.from_env()
+    _manager.preview_queue = preview_queue
+    _manager.load()
+
+
+def _warm_up_forked(threads: int = 0):
+    _set_threads(threads)
+    # The parent loaded on one thread (see load_for_fork)
+    _manager.profile = replace(_manager.profile, threads=threads)
+    _manager.warm_up()
+
+
+def run_batch(images, prompts, seeds=None, **options):
+    # preview_tokens, if any, are answered through the pool's preview queue
+    return _manager.run_batch(images, prompts, seeds, **options)
+
+
+def worker_status(all_workers: bool = False):
+    if all_workers:
+        # Held until every worker has picked up a call, so none answers twice
+        _barrier.wait(timeout=3600)
+    return {"pid": os.getpid(), **_manager.status()}
+
+
+def create_worker_pool(workers: int, threads: int = 0, preview_queue=None) -> ProcessPoolExecutor:
+    # Each worker process loads its own pipeline once, then serves batches
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_load_pipeline,
+        initargs=(context.Barrier(workers), threads, preview_queue),
+    )
+
+
+def create_forked_pool(manager, workers: int, threads: int = 0, preview_queue=None) -> ProcessPoolExecutor:
+    """Pool whose workers share `manager`'s weights copy-on-write.
+
+    Processes are forked when work is first submitted, so `load_for_fork`
+    must have run by then. Inference never writes to the weights, so their
+    pages stay shared; only activations are per worker. CPU profiles on
+    Linux only: a CUDA context does not survive fork.
+
+    Fork copies only the calling thread, and locks other threads hold at
+    that moment (anyio's worker threads, logging handlers, torch's thread
+    pools) stay held in the child forever. Workers are therefore forked at
+    the first submit, which warm_up makes right after load_for_fork and
+    before any request reaches the pool, and loading runs torch on a single
+    thread. That narrows the window rather than closing it, which is why
+    spawn stays the default.
+    """
+    global _manager, _barrier
+    if sys.platform != "linux":
+        raise ValueError("Forked inpainting workers are only supported on Linux.")
+    if manager.profile.device != "cpu":
+        raise ValueError("Forked inpainting workers need the cpu execution profile.")
+    if _cuda_initialized():
+        raise ValueError("CUDA is already initialized; forked workers would inherit a broken context.")
+    context = multiprocessing.get_context("fork")
+    _manager = manager
+    _manager.preview_queue = preview_queue
+    _barrier = context.Barrier(workers)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_warm_up_forked,
+        initargs=(threads,),
+    )
+
+
+def load_for_fork(manager):
+    # No warmup and a single torch thread: inference, or loading on many
+    # threads, would start torch's thread pools, which do not survive fork.
+    # Each worker sets its own thread count and warms up instead
+    manager.profile = replace(manager.profile, threads=1)
+    try:
+        manager.load(warmup=False)
+    finally:
+        # Keep the collector from touching (and so copying) inherited objects
+        gc.freeze()
+    if _cuda_initialized():
+        raise RuntimeError("Loading the pipeline initialized CUDA; workers cannot be forked.")
+
+
+async def warm_up(executor: ProcessPoolExecutor, workers: int):
+    # One status call per worker starts them all; they return once every
+    # worker has loaded and warmed up its pipeline
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(loop.run_in_executor(executor, worker_status, True) for _ in range(workers)))
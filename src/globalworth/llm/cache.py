@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional
+
+# Seconds a cached completion stays valid, per call site; 0 disables caching
+CALL_SITE_TTLS: Dict[str, float] = {
+    "inquiry_question": 24 * 3600,
+    "inquiry_extract": 3600,
+    "inquiry_turn": 3600,
+    "inquiry_match": 3600,
+    "design_question": 24 * 3600,
+    "design_extract": 3600,
+    "design_turn": 3600,
+    "initial_design": 3600,
+    "inpainting_prompts": 24 * 3600,
+}
+DEFAULT_TTL = 3600
+
+# Disk writes between sweeps of expired and surplus rows
+SWEEP_EVERY = 100
+
+
+def cache_key(model: str, messages, **params) -> str:
+    # Canonical JSON, so dict ordering and whitespace never change the key
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": params.get("temperature"),
+        "response_format": params.get("response_format"),
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Completion texts keyed by content hash.
+
+    A bounded in-memory LRU sits in front of an optional SQLite file, so
+    entries survive restarts. Expiry is stored as wall-clock time. Disk
+    reads and writes run in a worker thread; the file is swept of expired
+    rows, and of the soonest-expiring ones beyond max_disk_entries, on
+    open and every SWEEP_EVERY writes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        path: Optional[str] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        max_disk_entries: int = 100_000,
+    ):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttls = {**CALL_SITE_TTLS, **(ttls or {})}
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            self._sweep(time.time())
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        if os.getenv("LLM_CACHE", "1") != "1":
+            return None
+        ttls = {
+            call_site: float(os.getenv(f"LLM_CACHE_TTL_{call_site.upper()}", ttl))
+            for call_site, ttl in CALL_SITE_TTLS.items()
+        }
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+            path=os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3") or None,
+            ttls=ttls,
+            max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "100000")),
+        )
+
+    def ttl(self, call_site: str) -> float:
+        return self.ttls.get(call_site, DEFAULT_TTL)
+
+    async def get(self, call_site: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._counters[call_site]["memory_hits"] += 1
+                return entry[1]
+        row = None
+        if self._db is not None:
+            row = await asyncio.to_thread(self._read, key, now)
+        with self._lock:
+            if row is None:
+                self._counters[call_site]["misses"] += 1
+                return None
+            self._remember(key, row[1], row[0])
+            self._counters[call_site]["disk_hits"] += 1
+            return row[0]
+
+    async def put(self, call_site: str, key: str, value: str):
+        ttl = self.ttl(call_site)
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._write, key, value, expires_at)
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, key, now):
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+
+    def _write(self, key, value, expires_at):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % SWEEP_EVERY == 0:
+                self._sweep(time.time())
+
+    def _sweep(self, now):
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def evict_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (expires_at, _) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+        if self._db is not None:
+            with self._db_lock:
+                self._sweep(now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            call_sites = {k: dict(v) for k, v in self._counters.items()}
+        totals = {name: sum(c[name] for c in call_sites.values()) for name in ("memory_hits", "disk_hits", "misses")}
+        lookups = sum(totals.values())
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "hit_rate": (totals["memory_hits"] + totals["disk_hits"]) / lookups if lookups else 0.0,
+            **totals,
+            "call_sites": call_sites,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from globalworth.llm.cache import ResponseCache, cache_key
+from globalworth.llm.resilience import (
+    CLOSED, CircuitBreaker, CircuitOpen, LatencyWindow, LLMUnavailable, ResiliencePolicy, call_with_policy
+)
+from globalworth.metrics import REGISTRY, record_stage
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Per call site: (max concurrent requests, deadline in seconds). The deadline
+# covers the whole call, retries and hedged requests included
+CALL_SITE_LIMITS: Dict[str, Tuple[int, float]] = {
+    "inquiry_question": (32, 10.0),
+    "inquiry_extract": (32, 12.0),
+    "inquiry_turn": (32, 15.0),
+    "inquiry_match": (16, 30.0),
+    "design_question": (32, 10.0),
+    "design_extract": (32, 12.0),
+    "design_turn": (32, 15.0),
+    "initial_design": (8, 60.0),
+    "inpainting_prompts": (16, 20.0),
+}
+DEFAULT_LIMIT = (16, 20.0)
+
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens billed per call site, from the response usage fields.", ("call_site", "type")
+)
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "Attempts retried after a transient failure.", ("call_site",))
+LLM_HEDGES = REGISTRY.counter("llm_hedges_total", "Duplicate requests sent for slow attempts.", ("call_site",))
+LLM_FAILURES = REGISTRY.counter(
+    "llm_failures_total", "Completions given up on, by reason.", ("call_site", "reason")
+)
+
+
+class LLMClient:
+    """Shared AsyncOpenAI client with a bounded connection pool.
+
+    Every completion goes through `complete`, which applies the call site's
+    concurrency limit, deadline, retries, hedging and circuit breaker (see
+    resilience), raising LLMUnavailable when it cannot get an answer in time.
+    The base URL follows OPENAI_BASE_URL, so
+    the whole layer can be pointed at a local OpenAI-compatible server.
+    `complete_text` also consults the response cache, when one is set.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        limits: Optional[Dict[str, Tuple[int, float]]] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        policy: Optional[ResiliencePolicy] = None,
+    ):
+        self.cache = cache
+        self.policy = policy or ResiliencePolicy()
+        self.limits = {**CALL_SITE_LIMITS, **(limits or {})}
+        self._http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+        self.client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=self._http_client,
+            # Retries are ours, bounded by the call's deadline
+            max_retries=0,
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # Per call site, for the llm_waiting / llm_in_flight gauges
+        self.waiting: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+        REGISTRY.gauge(
+            "llm_waiting", "Completions queued on their call site's concurrency limit.",
+            self._gauge(self.waiting), ("call_site",)
+        )
+        REGISTRY.gauge(
+            "llm_in_flight", "Completions in progress per call site.", self._gauge(self.in_flight), ("call_site",)
+        )
+        REGISTRY.gauge(
+            "llm_breaker_open", "1 while a call site's circuit breaker rejects calls.",
+            lambda: {(call_site,): int(b.state != CLOSED) for call_site, b in self._breakers.items()}, ("call_site",)
+        )
+
+    @staticmethod
+    def _gauge(counts: Dict[str, int]):
+        return lambda: {(call_site,): count for call_site, count in counts.items()}
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        # LLM_CONCURRENCY_<CALL_SITE> / LLM_TIMEOUT_<CALL_SITE> override the defaults
+        limits = {}
+        for call_site, (concurrency, timeout) in CALL_SITE_LIMITS.items():
+            key = call_site.upper()
+            limits[call_site] = (
+                int(os.getenv(f"LLM_CONCURRENCY_{key}", concurrency)),
+                float(os.getenv(f"LLM_TIMEOUT_{key}", timeout)),
+            )
+        return cls(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "64")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "32")),
+            limits=limits,
+            cache=ResponseCache.from_env(),
+            policy=ResiliencePolicy.from_env(),
+        )
+
+    def _semaphore(self, call_site: str) -> asyncio.Semaphore:
+        if call_site not in self._semaphores:
+            concurrency, _ = self.limits.get(call_site, DEFAULT_LIMIT)
+            self._semaphores[call_site] = asyncio.Semaphore(concurrency)
+        return self._semaphores[call_site]
+
+    def _breaker(self, call_site: str) -> CircuitBreaker:
+        if call_site not in self._breakers:
+            self._breakers[call_site] = CircuitBreaker(self.policy.breaker_failures, self.policy.breaker_cooldown)
+        return self._breakers[call_site]
+
+    async def _attempt(self, call_site: str, timeout: float, **request):
+        semaphore = self._semaphore(call_site)
+        self.waiting[call_site] = self.waiting.get(call_site, 0) + 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[call_site] -= 1
+        self.in_flight[call_site] = self.in_flight.get(call_site, 0) + 1
+        started = time.perf_counter()
+        try:
+            response = await self.client.chat.completions.create(timeout=timeout, **request)
+        finally:
+            semaphore.release()
+            self.in_flight[call_site] -= 1
+        self._latencies.setdefault(call_site, LatencyWindow()).add(time.perf_counter() - started)
+        return response
+
+    async def complete(self, call_site: str, messages, model: str = DEFAULT_MODEL, **kwargs):
+        _, deadline = self.limits.get(call_site, DEFAULT_LIMIT)
+        breaker = self._breaker(call_site)
+        if not breaker.allow():
+            LLM_FAILURES.inc(1, call_site, "circuit_open")
+            raise CircuitOpen(f"Completions for {call_site} are suspended after repeated failures.")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + kwargs.pop("timeout", deadline)
+        request = dict(model=model, messages=messages, **kwargs)
+        started = time.perf_counter()
+        try:
+            response = await call_with_policy(
+                lambda remaining: self._attempt(call_site, remaining, **request),
+                self.policy,
+                deadline,
+                self._latencies.setdefault(call_site, LatencyWindow()),
+                on_retry=lambda: LLM_RETRIES.inc(1, call_site),
+                on_hedge=lambda: LLM_HEDGES.inc(1, call_site),
+            )
+        except LLMUnavailable as e:
+            breaker.failure()
+            LLM_FAILURES.inc(1, call_site, type(e).__name__)
+            raise
+        finally:
+            record_stage(f"llm.{call_site}", time.perf_counter() - started)
+        breaker.success()
+        if response.usage is not None:
+            LLM_TOKENS.inc(response.usage.prompt_tokens, call_site, "prompt")
+            LLM_TOKENS.inc(response.usage.completion_tokens, call_site, "completion")
+        return response
+
+    async def complete_text(self, call_site: str, messages, model: str = DEFAULT_MODEL, **kwargs) -> str:
+        key = None
+        if self.cache is not None and self.cache.ttl(call_site) > 0:
+            key = cache_key(model, messages, **kwargs)
+            cached = await self.cache.get(call_site, key)
+            if cached is not None:
+                return cached
+
+        response = await self.complete(call_site, messages, model=model, **kwargs)
+        content = response.choices[0].message.content
+        if key is not None and content is not None:
+            await self.cache.put(call_site, key, content)
+        return content
+
+    async def aclose(self):
+        await self.client.close()
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+# Failures worth another attempt; APITimeoutError is an APIConnectionError
+RETRYABLE = (APIConnectionError, RateLimitError, InternalServerError)
+
+
+class LLMUnavailable(Exception):
+    """A completion could not be obtained in time; callers may fall back."""
+
+
+class DeadlineExceeded(LLMUnavailable):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+@dataclass(frozen=True)
+class ResiliencePolicy:
+    retries: int = 2
+    # Full jitter: sleep uniformly up to min(backoff_cap, backoff * 2**retry)
+    backoff: float = 0.25
+    backoff_cap: float = 4.0
+    # A duplicate request goes out once the first is slower than this
+    # percentile of recent latencies; 0 disables hedging
+    hedge_percentile: float = 95
+    hedge_min_samples: int = 20
+    # Used until a call site has hedge_min_samples latencies
+    hedge_delay: float = 3.0
+    breaker_failures: int = 5
+    breaker_cooldown: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        return cls(
+            retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            backoff=float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.25")),
+            backoff_cap=float(os.getenv("LLM_RETRY_BACKOFF_CAP_SECONDS", "4")),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            hedge_delay=float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "3")),
+            breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            breaker_cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30")),
+        )
+
+    def backoff_delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff * 2**retry))
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful attempts of one call site."""
+
+    def __init__(self, size: int = 256):
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failed calls and rejects calls for
+    `cooldown` seconds; then lets one probe through per cooldown until a
+    call succeeds."""
+
+    def __init__(self, failures: int = 5, cooldown: float = 30.0):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._failed = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._opened_at = time.monotonic()
+            return True
+        return False
+
+    def success(self):
+        self.state = CLOSED
+        self._failed = 0
+
+    def failure(self):
+        self._failed += 1
+        if self.state == HALF_OPEN or self._failed >= self.failures:
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+
+async def hedged(attempt: Callable[[], Awaitable], delay: Optional[float], on_hedge=None):
+    """Runs `attempt`, starting a second copy if the first takes longer than
+    `delay`. The first success wins and the other copy is cancelled."""
+    tasks = {asyncio.ensure_future(attempt())}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                if on_hedge is not None:
+                    on_hedge()
+                tasks.add(asyncio.ensure_future(attempt()))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_policy(
+    attempt: Callable[[float], Awaitable],
+    policy: ResiliencePolicy,
+    deadline: float,
+    window: LatencyWindow,
+    on_retry=None,
+    on_hedge=None,
+):
+    """Calls `attempt(remaining_seconds)` until it succeeds, retrying
+    RETRYABLE failures with jittered backoff, all within `deadline` (a
+    loop.time() value). Raises DeadlineExceeded when time runs out and
+    LLMUnavailable when the retries do."""
+    loop = asyncio.get_running_loop()
+    for retry in range(policy.retries + 1):
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        delay = None
+        if policy.hedge_percentile > 0:
+            delay = policy.hedge_delay
+            if len(window) >= policy.hedge_min_samples:
+                delay = window.percentile(policy.hedge_percentile)
+        try:
+            return await asyncio.wait_for(
+                hedged(lambda: attempt(deadline - loop.time()), delay, on_hedge), remaining
+            )
+        except asyncio.TimeoutError:
+            break
+        except RETRYABLE as e:
+            pause = policy.backoff_delay(retry)
+            if retry == policy.retries or loop.time() + pause >= deadline:
+                raise LLMUnavailable(str(e)) from e
+            if on_retry is not None:
+                on_retry()
+            await asyncio.sleep(pause)
+    raise DeadlineExceeded("Completion deadline exceeded.")
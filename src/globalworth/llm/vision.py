@@ -0,0 +1,129 @@
+import base64
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Tuple
+
+from PIL import Image
+
+# How gpt-4o(-mini) bills images: "low" is a flat 85 tokens for a 512px
+# image, "high" is 85 plus 170 per 512px tile after fitting the image in
+# 2048x2048 and scaling its shorter side down to 768
+TILE = 512
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+MAX_SIDE = 2048
+SHORT_SIDE = 768
+
+# Shrink by up to this much to avoid paying for a barely used tile row/column
+SNAP_TOLERANCE = 0.15
+
+JPEG_QUALITY = 85
+
+
+@dataclass(frozen=True)
+class VisionPlan:
+    detail: str
+    size: Tuple[int, int]
+    tokens: int
+
+
+def _scaled(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    return max(1, math.floor(size[0] * scale)), max(1, math.floor(size[1] * scale))
+
+
+def _tiles(size: Tuple[int, int]) -> int:
+    return math.ceil(size[0] / TILE) * math.ceil(size[1] / TILE)
+
+
+def billed_size(width: int, height: int) -> Tuple[int, int]:
+    size = (width, height)
+    size = _scaled(size, min(1.0, MAX_SIDE / max(size)))
+    return _scaled(size, min(1.0, SHORT_SIDE / min(size)))
+
+
+def image_tokens(width: int, height: int, detail: str = "high") -> int:
+    if detail == "low":
+        return BASE_TOKENS
+    return BASE_TOKENS + TILE_TOKENS * _tiles(billed_size(width, height))
+
+
+def plan_image(width: int, height: int, budget: int) -> VisionPlan:
+    """Largest aspect-preserving size whose tile bill fits in `budget` tokens.
+
+    A single high-detail tile shows no more than "low" detail does, so
+    anything that would fit in one tile is sent as "low" instead.
+    """
+    low = VisionPlan("low", _scaled((width, height), min(1.0, TILE / max(width, height))), BASE_TOKENS)
+    max_tiles = (budget - BASE_TOKENS) // TILE_TOKENS
+    if max_tiles < 2:
+        return low
+
+    size = billed_size(width, height)
+    # Candidate scales put one side exactly on a tile boundary
+    scales = {1.0}
+    for side in size:
+        scales.update(TILE * k / side for k in range(1, math.ceil(side / TILE)))
+    best = None
+    for scale in sorted(scales, reverse=True):
+        candidate = _scaled(size, scale)
+        tiles = _tiles(candidate)
+        if tiles > max_tiles:
+            continue
+        if best is not None and scale < 1 - SNAP_TOLERANCE:
+            break
+        if best is None or tiles < best[1]:
+            best = (candidate, tiles)
+    size, tiles = best
+    if tiles == 1:
+        return low
+    return VisionPlan("high", size, BASE_TOKENS + TILE_TOKENS * tiles)
+
+
+def url_plan(budget: int) -> VisionPlan:
+    """Plan for an image passed through by URL, whose size is unknown: "high"
+    only if the largest possible high-detail bill fits in `budget`."""
+    size = (MAX_SIDE, SHORT_SIDE)
+    tokens = BASE_TOKENS + TILE_TOKENS * _tiles(size)
+    if budget >= tokens:
+        return VisionPlan("high", size, tokens)
+    return VisionPlan("low", (TILE, TILE), BASE_TOKENS)
+
+
+class VisionPreprocessor:
+    """Resizes and re-encodes images for vision calls, memoized by content hash."""
+
+    def __init__(self, max_entries: int = 256, quality: int = JPEG_QUALITY):
+        self.max_entries = max_entries
+        self.quality = quality
+        self._memory: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prepare(self, content: bytes, budget: int) -> Tuple[str, VisionPlan]:
+        """Returns a JPEG data URL and the plan it was encoded with."""
+        key = (hashlib.sha256(content).hexdigest(), budget)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached
+
+        image = Image.open(BytesIO(content))
+        plan = plan_image(image.width, image.height, budget)
+        image.draft("RGB", plan.size)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != plan.size:
+            image = image.resize(plan.size, reducing_gap=3.0)
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=self.quality)
+        url = f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+        with self._lock:
+            self._memory[key] = (url, plan)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return url, plan
@@ -0,0 +1,224 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Prometheus text exposition without a client library. Observations are a
+# bisect and two additions under a per-metric lock; gauges are callbacks read
+# only when /metrics is scraped, so queues are never polled on the hot path
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(256 * 4**i for i in range(10))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request header asking for a Server-Timing breakdown of the response
+TRACE_HEADER = b"x-trace"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Gauge:
+    """Read at scrape time from `read`, which returns a number, or a dict of
+    label values (tuples) to numbers when the gauge has labels."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.read = read
+
+    def samples(self):
+        values = self.read()
+        if not self.labels:
+            values = {(): values}
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        # Modules imported twice (or two apps in one process) share the metric
+        return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=SECONDS_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, read: Callable, labels: Tuple[str, ...] = ()) -> Gauge:
+        # The latest callback wins, e.g. after an app is recreated
+        self._metrics[name] = Gauge(name, help, read, labels)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Time spent in each processing stage.", ("stage",))
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "HTTP request latency until the response is complete.", ("method", "route", "status")
+)
+HTTP_REQUEST_BYTES = REGISTRY.histogram(
+    "http_request_bytes", "HTTP request body sizes.", ("method", "route"), BYTES_BUCKETS
+)
+HTTP_RESPONSE_BYTES = REGISTRY.histogram(
+    "http_response_bytes", "HTTP response body sizes.", ("method", "route"), BYTES_BUCKETS
+)
+
+# Stage timings of the current request, when it asked for a trace
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("trace", default=None)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, name)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def _server_timing(trace, total: float) -> bytes:
+    # Repeated stages (e.g. one decode per image) are added up
+    durations: Dict[str, float] = {}
+    for name, seconds in trace:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()).encode()
+
+
+class MetricsMiddleware:
+    """Records latency and payload sizes per route template.
+
+    Requests sending `X-Trace: 1` get a Server-Timing header listing the
+    stages they went through. Stages that finish after the response has
+    started (streamed bodies) are only in the histograms.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        headers = dict(scope["headers"])
+        trace = [] if headers.get(TRACE_HEADER) in (b"1", b"true") else None
+        token = _trace.set(trace)
+        status = 500
+        sent = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    timing = _server_timing(trace, time.perf_counter() - started)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing)]}
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _trace.reset(token)
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_SECONDS.observe(time.perf_counter() - started, method, route, status)
+            HTTP_REQUEST_BYTES.observe(int(headers.get(b"content-length", 0)), method, route)
+            HTTP_RESPONSE_BYTES.observe(sent, method, route)
@@ -0,0 +1,45 @@
+import re
+
+_FOLD = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    # Lowercase and strip Polish diacritics; keeps string length, so match
+    # offsets in the folded text are valid in the original
+    return text.lower().translate(_FOLD)
+
+
+def words(text: str):
+    return _WORD.findall(fold(text))
+
+
+# Common Polish inflectional endings (folded), longest first. Stripping one
+# maps most case forms of a name to the same stem ("Wola"/"Woli",
+# "Daszyńskiego"/"Daszyński"); stems only need to agree, not be words
+_SUFFIXES = (
+    "owie", "iego", "iemu", "ach", "ami", "ego", "emu", "ich", "ych", "imi", "ymi", "iej", "owa", "owe", "owy",
+    "ow", "om", "ie", "ia", "ej", "ym", "im", "a", "e", "i", "o", "u", "y",
+)
+MIN_STEM = 3
+
+STOPWORDS = {
+    "a", "al", "albo", "and", "at", "blisko", "do", "gdzies", "i", "in", "kolo", "lub", "na", "najlepiej",
+    "near", "niedaleko", "o", "obok", "od", "of", "okolica", "okolice", "okolicy", "or", "oraz", "przy",
+    "sie", "the", "ul", "w", "we", "z", "ze",
+}
+
+
+def stem(word: str) -> str:
+    # Expects a folded word; numbers and line names ("m2", "22") stay as they are
+    if len(word) <= MIN_STEM or not word.isalpha():
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[: -len(suffix)]
+    return word
+
+
+def terms(text: str):
+    return [stem(word) for word in words(text) if word not in STOPWORDS]
@@ -0,0 +1,47 @@
+import json
+import os
+
+from globalworth.catalog.store import OfficeCatalog
+
+
+def _write(directory, name, floors):
+    with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump({"budynek": {"nazwa": name}, "pietra": floors}, f)
+
+
+def _floor(number, area=500, price=20):
+    return {"numer": number, "powierzchnia": f"{area} m2", "cena": f"{price} EUR/m2"}
+
+
+def test_reload_publishes_a_new_snapshot(tmp_path):
+    _write(tmp_path, "Alfa", [_floor(1)])
+    catalog = OfficeCatalog(str(tmp_path)).load()
+    first = catalog.snapshot()
+    assert catalog.version == 1 and len(catalog) == 1
+    assert not catalog.refresh()
+    assert catalog.snapshot() is first
+
+    _write(tmp_path, "Beta", [_floor(1), _floor(2)])
+    assert catalog.refresh()
+    assert catalog.version == 2
+    assert first.version == 1 and list(first.buildings) == ["Alfa"]
+    assert catalog.get_floor("Beta", "2") is not None
+
+
+def test_derived_indexes_follow_the_snapshot(tmp_path):
+    _write(tmp_path, "Alfa", [_floor(1)])
+    catalog = OfficeCatalog(str(tmp_path)).load()
+    matrix, tables = catalog.floor_matrix(), catalog.area_tables()
+    assert catalog.floor_matrix() is matrix and catalog.area_tables() is tables
+
+    _write(tmp_path, "Beta", [_floor(1)])
+    catalog.refresh()
+    assert catalog.floor_matrix() is not matrix
+    assert sorted(catalog.area_tables()) == ["Alfa", "Beta"]
+
+
+def test_malformed_floor_is_skipped(tmp_path, caplog):
+    _write(tmp_path, "Alfa", [_floor(1), {"numer": "parter"}, {"powierzchnia": "100 m2"}, _floor(3)])
+    catalog = OfficeCatalog(str(tmp_path)).load()
+    assert [floor.number for floor in catalog.get_building("Alfa").floors] == [1, 3]
+    assert sum("Skipping floor" in record.message for record in caplog.records) == 2
@@ -0,0 +1,64 @@
+from datetime import date
+
+import pytest
+
+from globalworth.conversation.extractor import extract_inquiry_fields_locally, normalize_numbers
+
+TODAY = date(2026, 1, 15)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("sto dwadziescia metrow", "120 metrow"),
+        ("50 tys. zl", "50000 zl"),
+        ("80 000 zł", "80000 zl"),
+        ("półtora tysiąca", "1500"),
+    ],
+)
+def test_normalize_numbers(text, expected):
+    assert normalize_numbers(text) == expected
+
+
+@pytest.mark.parametrize(
+    "message, fields, covered",
+    [
+        ("120 m2 dla 20 osób", {"office_area_m2": 120, "number_of_employees": 20}, True),
+        ("budżet 80 000 zł", {"monthly_budget_net_PLN": 80000.0}, True),
+        ("budżet 5000 zł/miesiąc", {"monthly_budget_net_PLN": 5000.0}, True),
+        ("budżet 12 tys. zł rocznie", {"monthly_budget_net_PLN": 1000.0}, True),
+        # Prices per m2 are not monthly budgets, and must not be skipped over
+        ("120 m2 dla 20 osób, budżet 50 zł/m2", {"office_area_m2": 120, "number_of_employees": 20}, False),
+        ("budżet 50 pln za m²", {}, False),
+        ("60 zł za metr", {}, False),
+        ("budżet 120 m2", {"office_area_m2": 120}, True),
+        ("od 1 marca 2026 na 2 lata", {
+            "rental_period_start": "2026-03-01", "rental_period_end": "2028-03-01", "short_term_rental": False,
+        }, True),
+        ("dostęp 24/7", {"access_hours": "24/7"}, True),
+        ("nie krótkoterminowo", {"short_term_rental": False}, True),
+        ("biuro z widokiem na park", {}, False),
+        # "na miesiac" after a budget or headcount is a rate, not a lease term
+        ("budżet 5000 zł na miesiąc, 100 m2", {"monthly_budget_net_PLN": 5000.0, "office_area_m2": 100}, True),
+        ("20 osób na miesiąc", {"number_of_employees": 20}, True),
+        ("najem na 3 miesiące", {"short_term_rental": True}, True),
+        # Yearless ranges end on or after their start
+        ("od 1 czerwca do 31 grudnia", {"rental_period_start": "2026-06-01", "rental_period_end": "2026-12-31"}, True),
+        ("od 1 grudnia do 31 stycznia", {"rental_period_start": "2026-12-01", "rental_period_end": "2027-01-31"}, True),
+    ],
+)
+def test_extract_inquiry_fields_locally(message, fields, covered):
+    result = extract_inquiry_fields_locally(message, today=TODAY)
+    assert result.accepted() == fields
+    assert result.covered is covered
+
+
+def test_yearless_range_rolls_forward_together():
+    result = extract_inquiry_fields_locally("od 1 czerwca do 31 grudnia", today=date(2026, 10, 18))
+    assert result.accepted() == {"rental_period_start": "2027-06-01", "rental_period_end": "2027-12-31"}
+
+
+def test_contradictory_range_is_left_to_the_llm():
+    result = extract_inquiry_fields_locally("od 2027-06-01 do 2027-01-31", today=TODAY)
+    assert result.accepted() == {}
+    assert not result.covered
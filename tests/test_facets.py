@@ -0,0 +1,112 @@
+from datetime import date
+
+import pytest
+
+from globalworth.catalog.facets import SORTS, FacetIndex, OfficeSearch
+from globalworth.catalog.models import Building, Floor
+
+
+def _building(name, city, amenities, parking, floors):
+    raw = {"udogodnienia": amenities, "typ_biur": ["open space"], "typ_parkingu": parking}
+    return Building(name=name, city=city, raw=raw, floors=[
+        Floor(building=name, number=number, area_m2=area, price_per_m2=price, available=available,
+              available_from=available_from)
+        for number, area, price, available, available_from in floors
+    ])
+
+
+BUILDINGS = [
+    _building("Alfa", "Warszawa", ["klimatyzacja", "rowerownia"], "podziemny", [
+        (1, 500, 60.0, True, None),
+        (2, 300, 70.0, True, date(2026, 6, 1)),
+    ]),
+    _building("Beta", "Kraków", ["klimatyzacja"], "naziemny", [
+        (1, 800, 45.0, True, None),
+        (2, None, 50.0, True, None),
+    ]),
+    _building("Gamma", "Warszawa", ["rowerownia", "taras"], "podziemny", [
+        (1, 200, 90.0, False, None),
+        (5, 1000, 55.0, True, date(2027, 1, 1)),
+    ]),
+]
+
+
+@pytest.fixture
+def index():
+    return FacetIndex(BUILDINGS)
+
+
+def _floors(result):
+    return [(r["building"], r["floor"]) for r in result["results"]]
+
+
+def test_multi_valued_facets_need_all_values(index):
+    result = index.search(OfficeSearch(amenities=["klimatyzacja", "rowerownia"]))
+    assert _floors(result) == [("Alfa", 1), ("Alfa", 2)]
+
+
+def test_single_valued_facets_match_any_value(index):
+    result = index.search(OfficeSearch(building=["Alfa", "Beta"]))
+    assert result["total"] == 4
+
+
+def test_values_are_matched_folded(index):
+    assert index.search(OfficeSearch(city=["KRAKOW"]))["total"] == 2
+    assert index.search(OfficeSearch(city=["Poznań"]))["total"] == 0
+
+
+def test_counts_ignore_their_own_single_valued_filter(index):
+    result = index.search(OfficeSearch(city=["Kraków"], amenities=["klimatyzacja"]))
+    assert result["total"] == 2
+    # Other cities stay visible, narrowed by the amenity filter
+    assert result["facets"]["city"] == {"Kraków": 2, "Warszawa": 2}
+    assert result["facets"]["amenities"] == {"klimatyzacja": 2, "rowerownia": 0, "taras": 0}
+
+
+def test_ranges_and_flags(index):
+    assert _floors(index.search(OfficeSearch(min_area=400, max_price=58))) == [("Beta", 1), ("Gamma", 5)]
+    # Floors without an area drop out of area bounds
+    assert ("Beta", 2) not in _floors(index.search(OfficeSearch(max_area=10_000)))
+    assert index.search(OfficeSearch(available=False))["total"] == 1
+    by_date = index.search(OfficeSearch(available_by=date(2026, 12, 31)))
+    assert ("Alfa", 2) in _floors(by_date) and ("Gamma", 5) not in _floors(by_date)
+    assert index.search(OfficeSearch(max_monthly_cost=30_000))["ranges"]["monthly_cost"] == {"min": 18000.0, "max": 30000.0}
+
+
+def test_sort_puts_missing_values_last(index):
+    result = index.search(OfficeSearch(sort="-area", limit=100))
+    assert _floors(result)[0] == ("Gamma", 5)
+    assert _floors(result)[-1] == ("Beta", 2)
+
+
+@pytest.mark.parametrize("sort", SORTS)
+def test_cursor_pages_cover_every_floor_once(index, sort):
+    everything = _floors(index.search(OfficeSearch(sort=sort, limit=100)))
+    pages = []
+    cursor = None
+    while True:
+        result = index.search(OfficeSearch(sort=sort, limit=2, cursor=cursor))
+        pages.extend(_floors(result))
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == everything and len(everything) == 6
+
+
+def test_bad_cursors(index):
+    cursor = index.search(OfficeSearch(limit=1))["next_cursor"]
+    with pytest.raises(ValueError):
+        index.search(OfficeSearch(sort="price", cursor=cursor))
+    with pytest.raises(ValueError):
+        index.search(OfficeSearch(cursor="not-a-cursor"))
+    # The floor a cursor points at is gone after a catalog change
+    smaller = FacetIndex(BUILDINGS[1:])
+    with pytest.raises(ValueError):
+        smaller.search(OfficeSearch(limit=1, cursor=cursor))
+
+
+def test_etag_follows_query_and_catalog(index):
+    query = OfficeSearch(city=["Warszawa"])
+    assert index.etag(query) == FacetIndex(BUILDINGS).etag(OfficeSearch(city=["Warszawa"]))
+    assert index.etag(query) != index.etag(OfficeSearch(city=["Kraków"]))
+    assert index.etag(query) != FacetIndex(BUILDINGS[:2]).etag(query)
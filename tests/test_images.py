@@ -0,0 +1,32 @@
+import asyncio
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from globalworth.inpainting.api import open_image, open_native, read_image
+
+
+def _png(size=(64, 48)):
+    buffer = BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_open_native_trims_to_multiples_of_eight():
+    assert open_native(_png((70, 45))).size == (64, 40)
+
+
+@pytest.mark.parametrize("content", [b"not an image", _png()[:40]])
+def test_undecodable_bytes_are_bad_input(content):
+    with pytest.raises(ValueError):
+        open_image(content)
+    with pytest.raises(ValueError):
+        open_native(content)
+
+
+def test_read_image_rejects_garbage_base64():
+    encoded = base64.b64encode(b"not an image").decode()
+    with pytest.raises(ValueError):
+        asyncio.run(read_image(encoded))
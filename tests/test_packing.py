@@ -0,0 +1,79 @@
+from itertools import combinations, product
+
+import pytest
+
+from globalworth.catalog.models import Building, Floor
+from globalworth.catalog.packing import building_table, cheapest_configurations
+
+
+def _building(name, floors):
+    return Building(name=name, floors=[
+        Floor(building=name, number=number, area_m2=area, price_per_m2=price, subdivisions=subdivisions)
+        for number, area, price, subdivisions in floors
+    ])
+
+
+def _brute_force(floors, area):
+    # Every choice per floor: nothing, the whole floor, or a subset of subdivisions
+    per_floor = []
+    for _, floor_area, price, subdivisions in floors:
+        options = {0: 0.0, floor_area: floor_area * price}
+        for size in range(1, len(subdivisions) + 1):
+            for combo in combinations(subdivisions, size):
+                if sum(combo) <= floor_area:
+                    options[sum(combo)] = sum(combo) * price
+        per_floor.append(list(options.items()))
+    costs = [
+        sum(cost for _, cost in choice)
+        for choice in product(*per_floor)
+        if sum(total for total, _ in choice) >= area
+    ]
+    return min(costs) if costs else None
+
+
+FLOORS = [
+    (1, 500, 60.0, [100, 150, 250]),
+    (2, 400, 55.0, [120, 280]),
+    (3, 300, 70.0, []),
+    (4, 800, 50.0, [200, 200, 400]),
+]
+
+
+@pytest.mark.parametrize("area", [1, 90, 100, 130, 260, 399, 500, 700, 1000, 1500, 2000, 2001])
+def test_cheapest_matches_brute_force(area):
+    table = building_table(_building("A", FLOORS))
+    configuration = table.cheapest(area)
+    expected = _brute_force(FLOORS, area)
+    if expected is None:
+        assert configuration is None
+        return
+    assert configuration.monthly_cost == pytest.approx(expected)
+    assert configuration.total_area >= area
+    assert configuration.total_area == sum(a for _, a in configuration.units)
+
+
+def test_table_costs_increase_with_area():
+    table = building_table(_building("A", FLOORS))
+    costs = [cost for _, cost, _ in table.entries]
+    assert table.areas == sorted(table.areas)
+    assert costs == sorted(costs) and len(set(costs)) == len(costs)
+
+
+def test_unavailable_and_unpriced_floors_are_skipped():
+    building = _building("A", [(1, 500, 60.0, []), (2, 400, None, [])])
+    building.floors.append(Floor(building="A", number=3, area_m2=900, price_per_m2=10.0, available=False))
+    table = building_table(building)
+    assert table.areas == [500]
+
+
+def test_budget_and_ordering():
+    tables = [
+        building_table(_building("Cheap", [(1, 300, 40.0, [100, 200])])),
+        building_table(_building("Dear", [(1, 300, 80.0, [])])),
+    ]
+    ranked = cheapest_configurations(tables, 150)
+    assert [c.building for c in ranked] == ["Cheap", "Dear"]
+    assert ranked[0].units == ((1, 200),)
+    assert [c.building for c in cheapest_configurations(tables, 150, budget=10_000)] == ["Cheap"]
+    assert cheapest_configurations(tables, 150, limit=1)[0].building == "Cheap"
+    assert cheapest_configurations(tables, 400) == []
@@ -0,0 +1,148 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from globalworth.llm import resilience
+from globalworth.llm.resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, DeadlineExceeded, LatencyWindow, LLMUnavailable, ResiliencePolicy,
+    call_with_policy, hedged,
+)
+
+
+def _connection_error():
+    return APIConnectionError(request=httpx.Request("POST", "http://llm/v1/chat/completions"))
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_latency_window_percentile():
+    window = LatencyWindow(size=4)
+    assert window.percentile(95) is None
+    for seconds in (5, 1, 2, 3, 4):
+        window.add(seconds)
+    # Only the 4 most recent samples are kept
+    assert len(window) == 4
+    assert window.percentile(0) == 1
+    assert window.percentile(50) == 3
+    assert window.percentile(100) == 4
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    breaker = CircuitBreaker(failures=2, cooldown=10)
+    breaker.failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # One probe per cooldown
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_hedged_returns_the_faster_copy():
+    calls = []
+
+    async def attempt():
+        calls.append(len(calls))
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    async def main():
+        hedges = []
+        result = await asyncio.wait_for(hedged(attempt, 0.02, lambda: hedges.append(1)), 0.5)
+        return result, hedges
+
+    result, hedges = _run(main())
+    assert result == 2 and hedges == [1] and len(calls) == 2
+
+
+def test_hedged_without_delay_runs_once():
+    async def attempt():
+        return "ok"
+
+    assert _run(hedged(attempt, None)) == "ok"
+
+
+def _policy(**overrides):
+    return ResiliencePolicy(**{"retries": 2, "backoff": 0.001, "backoff_cap": 0.001, "hedge_percentile": 0, **overrides})
+
+
+def test_retries_retryable_errors():
+    failures = [_connection_error(), _connection_error()]
+
+    async def attempt(remaining):
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    async def main():
+        retries = []
+        loop = asyncio.get_running_loop()
+        result = await call_with_policy(
+            attempt, _policy(), loop.time() + 5, LatencyWindow(), on_retry=lambda: retries.append(1)
+        )
+        return result, retries
+
+    assert _run(main()) == ("ok", [1, 1])
+
+
+def test_gives_up_after_the_retries():
+    async def attempt(remaining):
+        raise _connection_error()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        await call_with_policy(attempt, _policy(retries=1), loop.time() + 5, LatencyWindow())
+
+    with pytest.raises(LLMUnavailable):
+        _run(main())
+
+
+def test_other_errors_are_not_retried():
+    calls = []
+
+    async def attempt(remaining):
+        calls.append(remaining)
+        raise ValueError("bad request")
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        await call_with_policy(attempt, _policy(), loop.time() + 5, LatencyWindow())
+
+    with pytest.raises(ValueError):
+        _run(main())
+    assert len(calls) == 1
+
+
+def test_deadline_exceeded():
+    async def attempt(remaining):
+        await asyncio.sleep(1)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        await call_with_policy(attempt, _policy(), loop.time() + 0.05, LatencyWindow())
+
+    with pytest.raises(DeadlineExceeded):
+        _run(main())
@@ -0,0 +1,34 @@
+import asyncio
+import os
+
+from globalworth.inpainting.cache import ResultCache
+
+
+def test_disk_entries_keep_their_format(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_bytes=0)
+    asyncio.run(cache.put("a", b"jpeg bytes", "jpeg"))
+    asyncio.run(cache.put("b", b"png bytes"))
+    assert sorted(os.listdir(tmp_path)) == ["a.jpeg", "b.png"]
+
+    reopened = ResultCache(str(tmp_path), memory_bytes=0)
+    assert asyncio.run(reopened.get("a", "jpeg")) == b"jpeg bytes"
+    assert asyncio.run(reopened.get("a", "png")) is None
+    assert reopened.stats()["hits"] == 1 and reopened.stats()["misses"] == 1
+
+
+def test_disk_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_bytes=0, disk_bytes=20)
+    asyncio.run(cache.put("a", b"x" * 8))
+    asyncio.run(cache.put("b", b"x" * 8))
+    assert asyncio.run(cache.get("a")) is not None
+    asyncio.run(cache.put("c", b"x" * 8))
+    assert sorted(os.listdir(tmp_path)) == ["a.png", "c.png"]
+    assert cache.stats()["disk_bytes"] == 16
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_bytes=0)
+    asyncio.run(cache.put("a", b"data"))
+    os.remove(tmp_path / "a.png")
+    assert asyncio.run(cache.get("a")) is None
+    assert cache.stats()["disk_entries"] == 0
@@ -0,0 +1,63 @@
+import pytest
+
+from globalworth.catalog.models import Building
+from globalworth.catalog.text_index import TextIndex
+from globalworth.text import fold, stem, terms
+
+
+def _building(name, location, description="", stops=()):
+    raw = {
+        "budynek": {"nazwa": name, "lokalizacja": location, "miasto": "Warszawa", "opis_okolicy": description},
+        "transport": {"metro": [{"przystanek": stop, "linie": ["M1"]} for stop in stops]},
+    }
+    return Building(name=name, raw=raw)
+
+
+BUILDINGS = [
+    _building("Wola Tower", "Wola", "Biurowiec przy rondzie Daszyńskiego", stops=["Rondo Daszyńskiego"]),
+    _building("Mokotów Park", "Mokotów", "Zielona okolica na Służewcu", stops=["Wilanowska"]),
+    _building("Centrum Plaza", "Śródmieście", "Centrum miasta, blisko Dworca Centralnego", stops=["Centrum"]),
+]
+
+
+def test_fold_keeps_length():
+    assert fold("Śródmieście Łódź") == "srodmiescie lodz"
+
+
+@pytest.mark.parametrize("a, b", [("Woli", "Wola"), ("Daszyńskiego", "Daszyński"), ("Mokotowie", "Mokotów")])
+def test_case_forms_share_a_stem(a, b):
+    assert terms(a) == terms(b)
+
+
+def test_short_words_and_numbers_are_not_stemmed():
+    assert stem("m2") == "m2" and stem("22") == "22" and stem("ulo") == "ulo"
+
+
+def test_stopwords_are_dropped():
+    assert terms("blisko Woli") == terms("Wola")
+
+
+@pytest.mark.parametrize(
+    "query, best",
+    [
+        ("na Woli", "Wola Tower"),
+        ("okolice ronda Daszyńskiego", "Wola Tower"),
+        ("Mokotów, Służewiec", "Mokotów Park"),
+        ("centrum miasta", "Centrum Plaza"),
+        ("blisko metra Wilanowska", "Mokotów Park"),
+    ],
+)
+def test_search_ranks_the_matching_building_first(query, best):
+    index = TextIndex.build(BUILDINGS)
+    assert index.search(query, top_k=1)[0][0] == best
+
+
+def test_unknown_terms_score_nothing():
+    index = TextIndex.build(BUILDINGS)
+    assert index.scores("Kraków") == {}
+    assert index.search("") == []
+
+
+def test_repeated_query_terms_count_once():
+    index = TextIndex.build(BUILDINGS)
+    assert index.scores("Wola Wola") == index.scores("Wola")